@@ -0,0 +1,196 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+# rank.py lives one folder up; it reads and writes relative to the working directory,
+# so every scale runs in its own generated workspace
+repo_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_folder)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import rank
+import synth_export
+
+# Stages timed in each workspace, in pipeline order ('total' is a full rank.main run)
+# 'warm' stages repeat the pass with every chat's aggregate cached, as on a deploy run whose export did not change
+stage_names = ['load', 'aggregate', 'load warm', 'aggregate warm', 'photos', 'score', 'render', 'write', 'total', 'total warm']
+
+# Function to start a stage, resetting the traced memory peak when tracemalloc is on
+def start_stage():
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    return time.perf_counter()
+
+# Function to record a stage's seconds, and its peak traced memory when tracemalloc is on
+def finish_stage(timings, peaks, names, started):
+    seconds = time.perf_counter() - started
+    for name in names:
+        timings[name] = seconds
+        if tracemalloc.is_tracing():
+            peaks[name] = tracemalloc.get_traced_memory()[1]
+
+# Function to read every chat as raw JSON text and aggregate it through process_chat, as main() does by default
+# Times `load` (reading and scanning the export) and `aggregate` (fingerprint, decode on a miss, count)
+# Returns the records, their cache entries and the number of chats in the export
+def read_chats(timings, peaks, load_name, aggregate_name):
+    records = []
+    cache = {}
+    chat_counts = {'chats': 0}
+    aggregate_time = 0
+    run_started = time.time()
+    started = start_stage()
+    with zipfile.ZipFile(rank.zip_file) as zip_ref, zip_ref.open('result.json') as raw, io.TextIOWrapper(raw, encoding='utf-8') as f:
+        for chat in rank.iter_export_chats(f, chat_counts, raw=True):
+            aggregate_started = time.perf_counter()
+            record, tail_key = rank.process_chat(chat)[:2]
+            cache[tail_key] = dict(record)
+            record['date diff'] = rank.days_since(record['newest date'], run_started)
+            records.append(record)
+            aggregate_time += time.perf_counter() - aggregate_started
+    # Both share the pass's memory peak
+    finish_stage(timings, peaks, [load_name, aggregate_name], started)
+    timings[load_name] -= aggregate_time
+    timings[aggregate_name] = aggregate_time
+    return records, cache, chat_counts['chats']
+
+# Function to time the pipeline stages of rank.py in the current workspace
+# Stages call the same functions main() does, single process, with rank.py's output discarded
+# Returns seconds and peak traced bytes per stage (peaks only while tracemalloc is tracing)
+def time_stages():
+    timings = {}
+    peaks = {}
+    rank.args = rank.parser.parse_args(['--offline', '--no-derivatives'])
+    rank.init_worker(rank.args, {}, {}, None, None, {})
+    rank.url_status.clear()
+    for folder in [rank.output_folder, rank.html_subfolder, rank.history_subfolder]:
+        os.makedirs(folder, exist_ok=True)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # load/aggregate: nothing cached, so every chat is scanned, fingerprinted, decoded and counted
+        records, cache, chats = read_chats(timings, peaks, 'load', 'aggregate')
+        # load warm/aggregate warm: the same export with every aggregate cached, so no chat is decoded
+        rank.aggregate_cache = cache
+        read_chats(timings, peaks, 'load warm', 'aggregate warm')
+        rank.aggregate_cache = {}
+
+        # photos: index Photos/ and resolve every URL the pages may reference
+        started = start_stage()
+        rank.photo_index = rank.index_photos()
+        rank.check_urls_accessible([url for record in records for url in rank.collect_group_urls(record['group name'])])
+        finish_stage(timings, peaks, ['photos'], started)
+
+        # score: pack the columns, score and rank every group
+        started = start_stage()
+        weights = rank.default_scoring_weights
+        scores = rank.score_groups(rank.score_columns(records, weights['hashtags']), weights)[3]
+        ranks = [0] * len(records)
+        for position, i in enumerate(rank.rank_order(scores), 1):
+            ranks[i] = position
+        finish_stage(timings, peaks, ['score'], started)
+
+        # render: build every group page in memory; write: put them on disk
+        pages = []
+        write_if_changed = rank.write_if_changed
+        rank.write_if_changed = lambda path, content: pages.append((path, content)) or True
+        try:
+            started = start_stage()
+            for record, group_rank in zip(records, ranks):
+                rank.render_group_page(record, group_rank, [], chats + 1)
+            finish_stage(timings, peaks, ['render'], started)
+        finally:
+            rank.write_if_changed = write_if_changed
+        started = start_stage()
+        for path, content in pages:
+            rank.write_if_changed(path, content)
+        finish_stage(timings, peaks, ['write'], started)
+        pages.clear()
+
+        # total: a full offline run from a clean docs/ and no aggregate cache, as a first deploy does it
+        # total warm: the same run again over its own output and cache, as a deploy of an unchanged export does it
+        shutil.rmtree(rank.output_folder)
+        if os.path.exists(rank.aggregate_cache_file):
+            os.remove(rank.aggregate_cache_file)
+        for name in ['total', 'total warm']:
+            rank.url_status.clear()
+            started = start_stage()
+            rank.main(['--offline', '--no-derivatives'])
+            finish_stage(timings, peaks, [name], started)
+
+    return timings, peaks, {'groups': len(records), 'messages': sum(record['total messages'] for record in records)}
+
+# Function to generate a workspace at a scale and time its stages, best of `repeat` runs per stage
+# With memory=True one more run under tracemalloc records each stage's peak (tracing slows it, so it is not timed)
+def bench_scale(scale, messages, repeat, keep, seed, memory=False):
+    groups = max(1, round(synth_export.base_groups * scale))
+    workspace = tempfile.mkdtemp(prefix=f'psbench-{scale:g}x-')
+    cwd = os.getcwd()
+    try:
+        started = time.perf_counter()
+        synth_export.make_workspace(workspace, groups, messages, seed=seed)
+        generated = time.perf_counter() - started
+        os.chdir(workspace)
+        runs = []
+        for _ in range(repeat):
+            timings, _, sizes = time_stages()
+            runs.append(timings)
+        result = dict(sizes, **{
+            'scale': scale,
+            'export bytes': os.path.getsize(rank.zip_file),
+            'generate seconds': round(generated, 3),
+            'stages': {name: round(min(run[name] for run in runs), 4) for name in stage_names}
+        })
+        if memory:
+            tracemalloc.start()
+            try:
+                result['peak bytes'] = time_stages()[1]
+            finally:
+                tracemalloc.stop()
+        return result
+    finally:
+        os.chdir(cwd)
+        if keep:
+            print(f"Kept workspace {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+# Function to print one row per scale with the seconds spent in each stage
+def print_results(results):
+    widths = [max(9, len(name)) for name in stage_names]
+    print('  '.join(['scale'.rjust(7), 'groups'.rjust(7), 'messages'.rjust(9), 'MB'.rjust(7)] + [name.rjust(width) for name, width in zip(stage_names, widths)]))
+    for result in results:
+        cells = [f"{result['scale']:g}x".rjust(7), str(result['groups']).rjust(7), str(result['messages']).rjust(9),
+                 f"{result['export bytes'] / 1e6:.1f}".rjust(7)]
+        print('  '.join(cells + [f"{result['stages'][name]:.3f}".rjust(width) for name, width in zip(stage_names, widths)]))
+        if 'peak bytes' in result:
+            print('  '.join(['peak MB'.rjust(36)] + [f"{result['peak bytes'][name] / 1e6:.1f}".rjust(width) for name, width in zip(stage_names, widths)]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the stages of rank.py on synthetic exports at multiples of the real export size.')
+    parser.add_argument('--scale', type=float, nargs='+', default=[1, 10, 100], metavar='N',
+                        help=f'export sizes as multiples of the real one ({synth_export.base_groups} groups; default: 1 10 100)')
+    parser.add_argument('--messages', type=int, default=synth_export.base_messages,
+                        help=f'messages per group (default: {synth_export.base_messages})')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per scale, the fastest time of each stage is kept (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the synthetic export (default: 0)')
+    parser.add_argument('--keep', action='store_true', help='keep the generated workspaces')
+    parser.add_argument('--memory', action='store_true', help='also record each stage\'s peak traced memory (one extra run per scale)')
+    parser.add_argument('--json', metavar='FILE', help='also write the results to FILE')
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scale:
+        print(f"Benchmarking {scale:g}x ({max(1, round(synth_export.base_groups * scale))} groups x {args.messages} messages)")
+        results.append(bench_scale(scale, args.messages, args.repeat, args.keep, args.seed, args.memory))
+    print()
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': sys.version.split()[0], 'results': results}, f, indent=2)
+        print(f"\nWrote {args.json}")
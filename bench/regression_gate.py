@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import bench_stages
+
+bench_folder = os.path.dirname(os.path.abspath(__file__))
+
+# The fixed workload every gate run measures: 30x the real export, same seed each time
+# (large enough that the page stages take tens of milliseconds, well clear of timer noise)
+gate_workload = {'scale': 30, 'messages': 680, 'seed': 0, 'repeat': 3}
+
+# Committed baseline the gate compares against, and the append-only log of every gate run (one JSON object per line)
+baseline_file = os.path.join(bench_folder, 'baseline.json')
+history_file = os.path.join(bench_folder, 'history.jsonl')
+
+# A stage regresses when it is more than the threshold slower (or bigger) than the baseline
+# and the change is also past its noise floor: a share of the stage's own baseline, but never
+# below a small absolute minimum, so sub-millisecond stages do not fail on timer jitter
+default_threshold = 0.25
+noise_share = 0.1
+min_seconds = 0.005
+min_peak_bytes = 1 << 18
+
+# Function to describe the machine, so results from different hardware are not silently compared
+def machine_info():
+    return {'python': sys.version.split()[0], 'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+# Function to read the commit being measured (None outside a git checkout)
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=bench_folder, capture_output=True, check=True, text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+# Function to run the fixed workload, returning per-stage seconds and peak traced bytes
+def run_workload():
+    result = bench_stages.bench_scale(gate_workload['scale'], gate_workload['messages'], gate_workload['repeat'],
+                                      False, gate_workload['seed'], memory=True)
+    return {'workload': gate_workload, 'machine': machine_info(), 'groups': result['groups'], 'messages': result['messages'],
+            'stages': result['stages'], 'peak bytes': result['peak bytes']}
+
+# Function to compare a run against the baseline, one row per stage and metric
+# Returns the rows and whether any of them regressed
+def compare(baseline, current, threshold):
+    rows = []
+    regressed = False
+    for metric, floor, unit in (('stages', min_seconds, 's'), ('peak bytes', min_peak_bytes, 'MB')):
+        scale = 1e6 if unit == 'MB' else 1
+        for name in bench_stages.stage_names:
+            before = baseline[metric].get(name)
+            after = current[metric][name]
+            if before is None:
+                rows.append((metric, name, '-', f"{after / scale:.3f}{unit}", '', 'new'))
+                continue
+            change = (after - before) / before if before else 0
+            noise = max(floor, noise_share * before)
+            if after > before * (1 + threshold) and after - before > noise:
+                status = 'REGRESSED'
+                regressed = True
+            elif after < before * (1 - threshold) and before - after > noise:
+                status = 'improved'
+            else:
+                status = 'ok'
+            rows.append((metric, name, f"{before / scale:.3f}{unit}", f"{after / scale:.3f}{unit}", f"{change:+.0%}", status))
+    return rows, regressed
+
+# Function to print the comparison table
+def print_comparison(rows):
+    width = max(len(name) for name in bench_stages.stage_names)
+    print('  '.join(['metric'.ljust(10), 'stage'.ljust(width), 'baseline'.rjust(10), 'current'.rjust(10), 'change'.rjust(7), 'status']))
+    for metric, name, before, after, change, status in rows:
+        print('  '.join([('time' if metric == 'stages' else 'memory').ljust(10), name.ljust(width), before.rjust(10), after.rjust(10), change.rjust(7), status]))
+
+# Function to append a run to the history log (never rewritten, so trends stay visible)
+def append_history(current, passed):
+    entry = {'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'commit': git_commit(), 'passed': passed}
+    entry.update(current)
+    with open(history_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + '\n')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a fixed synthetic workload and fail when a stage of rank.py got slower or bigger than the baseline.')
+    parser.add_argument('--threshold', type=float, default=default_threshold,
+                        help=f'allowed slowdown or memory growth per stage as a fraction (default: {default_threshold})')
+    parser.add_argument('--update-baseline', action='store_true', help=f'write this run as the new {os.path.basename(baseline_file)} instead of comparing')
+    parser.add_argument('--no-history', action='store_true', help=f'do not append this run to {os.path.basename(history_file)}')
+    args = parser.parse_args()
+
+    print(f"Running the gate workload: {gate_workload['scale']}x export, {gate_workload['messages']} messages per group, best of {gate_workload['repeat']}")
+    current = run_workload()
+
+    if args.update_baseline:
+        with open(baseline_file, 'w', encoding='utf-8') as f:
+            json.dump(dict(current, date=time.strftime('%Y-%m-%d'), commit=git_commit()), f, indent=2)
+            f.write('\n')
+        print(f"Wrote baseline {baseline_file}")
+        if not args.no_history:
+            append_history(current, True)
+        sys.exit(0)
+
+    try:
+        with open(baseline_file, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not read baseline {baseline_file} ({e}); create it with --update-baseline. Exiting.")
+        sys.exit(1)
+    if baseline.get('workload') != gate_workload:
+        print(f"Error: {baseline_file} was recorded for a different workload {baseline.get('workload')}; re-record it with --update-baseline. Exiting.")
+        sys.exit(1)
+    if baseline.get('machine') != current['machine']:
+        print(f"Warning: baseline recorded on {baseline.get('machine')}, this run on {current['machine']}; timings may not be comparable")
+
+    rows, regressed = compare(baseline, current, args.threshold)
+    print()
+    print_comparison(rows)
+    if not args.no_history:
+        append_history(current, not regressed)
+        print(f"\nAppended this run to {history_file}")
+    if regressed:
+        print(f"\nFAILED: stages regressed by more than {args.threshold:.0%} against {baseline_file} (commit {baseline.get('commit')})")
+        sys.exit(1)
+    print(f"\nPassed: no stage regressed by more than {args.threshold:.0%}")
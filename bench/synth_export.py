@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import random
+import zipfile
+from datetime import datetime
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Size of the real export the scales are multiples of (PS/result333.json: 10 private supergroups, ~680 messages each)
+base_groups = 10
+base_messages = 680
+
+# Share of messages carrying hashtags and of service messages that open a topic, as in the real export
+default_hashtag_rate = 0.02
+default_topic_rate = 0.015
+
+# Hashtags drawn for tagged messages (ratings and scene types in mixed case, plus free-form tags)
+synthetic_hashtags = ['#FIVE', '#FOUR', '#Three', '#four', '#FM', '#ffm', '#FF', '#FMM', '#ORGY', '#Blonde', '#POV', '#Studio']
+
+# Smallest valid GIF (1x1), used for thumbs/ media and for photos when Pillow is not installed
+tiny_gif = b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+
+# Function to name the synthetic groups (stable for a given count, so Photos/ matches the export)
+def group_names(groups):
+    return [f"Synthetic Group {i:05d}" for i in range(groups)]
+
+# Function to build one chat's messages in Telegram export shape
+# Returns the messages and the number of topics opened, whose serials the thumbs/ media follow
+def synth_messages(rng, name, messages, hashtag_rate, topic_rate, newest):
+    span = rng.randint(30, 900) * 86400
+    started = newest - span
+    step = max(span // max(messages, 1), 1)
+    chat_messages = [
+        {'id': -1, 'type': 'service', 'date': datetime.fromtimestamp(started).isoformat(), 'date_unixtime': str(started),
+         'actor': 'Synthetic', 'actor_id': 'user1', 'action': 'create_group', 'title': name, 'members': ['Synthetic'], 'text': '', 'text_entities': []}
+    ]
+    topics = 0
+    for message_id in range(1, messages + 1):
+        timestamp = started + message_id * step
+        date = datetime.fromtimestamp(timestamp).isoformat()
+        if rng.random() < topic_rate:
+            topics += 1
+            chat_messages.append({'id': message_id, 'type': 'service', 'date': date, 'date_unixtime': str(timestamp),
+                                  'actor': 'Synthetic', 'actor_id': 'user1', 'action': 'topic_created',
+                                  'title': f"{name} - Scene {topics}", 'text': '', 'text_entities': []})
+            continue
+        if rng.random() < hashtag_rate:
+            text = []
+            for hashtag in rng.sample(synthetic_hashtags, rng.randint(1, 3)):
+                text.extend([{'type': 'hashtag', 'text': hashtag}, ' '])
+            text.pop()
+            entities = [entity if isinstance(entity, dict) else {'type': 'plain', 'text': entity} for entity in text]
+        else:
+            text = ''
+            entities = []
+        message = {'id': message_id, 'type': 'message', 'date': date, 'date_unixtime': str(timestamp),
+                   'from': 'Synthetic', 'from_id': 'user1', 'text': text, 'text_entities': entities}
+        if not text:
+            message.update({'photo': '(File not included. Change data exporting settings to download.)',
+                            'photo_file_size': rng.randint(50000, 400000), 'width': 853, 'height': 1280})
+        chat_messages.append(message)
+    return chat_messages, topics
+
+# Function to write a synthetic export to a zip, one chat at a time so any scale fits in memory
+# Returns the topic count of each group, for write_photos
+def write_export(zip_path, groups, messages, hashtag_rate=default_hashtag_rate, topic_rate=default_topic_rate, seed=0):
+    rng = random.Random(seed)
+    now = int(datetime.now().timestamp())
+    topic_counts = {}
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        with zip_ref.open('result.json', 'w', force_zip64=True) as raw:
+            raw.write(b'{\n "about": "Synthetic export for benchmarks",\n "chats": {\n  "about": "This page lists all chats from this export.",\n  "list": [\n')
+            for i, name in enumerate(group_names(groups)):
+                chat_messages, topic_counts[name] = synth_messages(rng, name, messages, hashtag_rate, topic_rate, now - rng.randint(0, 365) * 86400)
+                chat = {'name': name, 'type': 'private_supergroup', 'id': 2000000000 + i, 'messages': chat_messages}
+                raw.write((',\n' if i else '').encode('utf-8'))
+                raw.write(json.dumps(chat, ensure_ascii=False, indent=1).encode('utf-8'))
+                # A personal chat every ten groups, which the reader has to skip
+                if i % 10 == 9:
+                    personal = {'name': f"Person {i}", 'type': 'personal_chat', 'id': 100000 + i,
+                                'messages': [{'id': 1, 'type': 'message', 'date': '2024-01-01T00:00:00', 'date_unixtime': '1704067200', 'text': 'hi', 'text_entities': []}]}
+                    raw.write((',\n' + json.dumps(personal, indent=1)).encode('utf-8'))
+            raw.write(b'\n  ]\n }\n}\n')
+    return topic_counts
+
+# Function to write a photo, a noisy JPEG with Pillow or a tiny GIF without it
+def write_photo(path, rng, size):
+    if Image is None:
+        with open(path, 'wb') as f:
+            f.write(tiny_gif)
+        return
+    image = Image.effect_noise(size, rng.randint(20, 80)).convert('RGB')
+    image.save(path, 'JPEG', quality=85)
+
+# Function to write a Photos/ tree matching a synthetic export: a cover per group, a gallery,
+# and thumbs/<serial>.gif for a share of each group's topics
+def write_photos(photos_folder, topic_counts, photos_per_group=4, thumb_rate=0.5, photo_size=(320, 200), seed=0):
+    rng = random.Random(seed)
+    os.makedirs(photos_folder, exist_ok=True)
+    for name, topics in topic_counts.items():
+        group_folder = os.path.join(photos_folder, name)
+        os.makedirs(os.path.join(group_folder, 'thumbs'), exist_ok=True)
+        write_photo(os.path.join(photos_folder, f"{name}.jpg"), rng, photo_size)
+        for i in range(photos_per_group):
+            write_photo(os.path.join(group_folder, f"photo_{i:03d}.jpg"), rng, photo_size)
+        for serial in range(1, topics + 1):
+            if rng.random() < thumb_rate:
+                with open(os.path.join(group_folder, 'thumbs', f"{serial}.gif"), 'wb') as f:
+                    f.write(tiny_gif)
+
+# Function to generate an export and its Photos/ tree in a workspace laid out like the repo (PS/result.zip, Photos/)
+def make_workspace(workspace, groups, messages, hashtag_rate=default_hashtag_rate, topic_rate=default_topic_rate,
+                   photos_per_group=4, photo_size=(320, 200), seed=0):
+    os.makedirs(os.path.join(workspace, 'PS'), exist_ok=True)
+    topic_counts = write_export(os.path.join(workspace, 'PS', 'result.zip'), groups, messages, hashtag_rate, topic_rate, seed)
+    write_photos(os.path.join(workspace, 'Photos'), topic_counts, photos_per_group, photo_size=photo_size, seed=seed)
+    return topic_counts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic Telegram export (PS/result.zip) and Photos/ tree for benchmarking rank.py.')
+    parser.add_argument('workspace', help='folder to write PS/result.zip and Photos/ into')
+    parser.add_argument('--scale', type=float, default=1, help=f'multiple of the real export size ({base_groups} groups, default: 1)')
+    parser.add_argument('--groups', type=int, help='number of private supergroups (overrides --scale)')
+    parser.add_argument('--messages', type=int, default=base_messages, help=f'messages per group (default: {base_messages})')
+    parser.add_argument('--hashtag-rate', type=float, default=default_hashtag_rate, help=f'share of messages with hashtags (default: {default_hashtag_rate})')
+    parser.add_argument('--topic-rate', type=float, default=default_topic_rate, help=f'share of messages that open a topic (default: {default_topic_rate})')
+    parser.add_argument('--photos', type=int, default=4, help='gallery photos per group (default: 4)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    args = parser.parse_args()
+    groups = args.groups if args.groups is not None else max(1, round(base_groups * args.scale))
+    topic_counts = make_workspace(args.workspace, groups, args.messages, args.hashtag_rate, args.topic_rate, args.photos, seed=args.seed)
+    print(f"Wrote {groups} groups x {args.messages} messages ({sum(topic_counts.values())} topics) to {args.workspace}")
@@ -1,85 +1,327 @@
+import argparse
+import hashlib
 import json
 import csv
+import contextlib
+import cProfile
+import io
 import os
-import shutil
-from datetime import datetime
+import pstats
+from datetime import datetime, timedelta
 import re
+import shutil
+import sqlite3
+import subprocess
 import zipfile
 import random
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 from html import escape
 import requests
+from requests.adapters import HTTPAdapter
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # Define folder paths
 input_folder = 'PS'
 output_folder = 'docs'
 html_subfolder = os.path.join(output_folder, 'HTML')
+history_subfolder = os.path.join(output_folder, 'history')
 photos_folder = 'Photos'
 history_csv_file = os.path.join(output_folder, 'history.csv')
+history_db_file = os.path.join(output_folder, 'history.sqlite')
 csv_file = os.path.join(output_folder, 'output.csv')
+ranking_json_file = os.path.join(output_folder, 'ranking.json')
+cache_folder = '.cache'
+url_cache_file = os.path.join(cache_folder, 'url_cache.json')
+aggregate_cache_file = os.path.join(cache_folder, 'chat_aggregates.json')
+scoring_config_file = 'scoring.json'
+run_report_file = 'run_report.json'
+profile_file = 'rank.prof'
+zip_file = os.path.join(input_folder, 'result.zip')
+derivative_folder = os.path.join(cache_folder, 'derivatives')
+image_folder = os.path.join(output_folder, 'img')
+asset_folder = os.path.join(output_folder, 'assets')
 
-# GitHub raw content base URL
+# GitHub raw content base URL (--raw-base points it elsewhere, e.g. a local HTTP server for benchmarks)
 github_raw_base = 'https://raw.githubusercontent.com/anagoofyoutlook/psranking-dev/main'
 
-# Ensure directories exist
-for folder in [input_folder, output_folder, html_subfolder, photos_folder]:
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-        print(f"Created directory: {folder}")
-    else:
-        print(f"Directory already exists: {folder}")
+# Chart.js build loaded by group pages when their rank chart comes into view
+chartjs_url = 'https://cdn.jsdelivr.net/npm/chart.js@4.4.2/dist/chart.umd.min.js'
 
-# Path to result.zip
-zip_file = os.path.join(input_folder, 'result.zip')
-temp_json_file = os.path.join(input_folder, 'result.json')
+# Concurrent URL checks (thread count doubles as the keep-alive pool size)
+url_check_workers = 16
+url_check_timeout = 5
 
-# Verify ZIP file existence and extract result.json
-if not os.path.exists(zip_file):
-    print(f"Error: 'result.zip' not found in '{input_folder}'. Exiting.")
-    exit(1)
+# Persistent URL check cache (entries older than the TTL are re-probed and evicted)
+url_cache_ttl_hours = 7 * 24
+url_cache_max_entries = 50000
 
-print(f"Extracting {zip_file}")
-try:
-    with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-        json_found = False
-        for file_info in zip_ref.infolist():
-            if file_info.filename.endswith('result.json'):
-                zip_ref.extract(file_info, input_folder)
-                extracted_path = os.path.join(input_folder, file_info.filename)
-                if extracted_path != temp_json_file:
-                    shutil.move(extracted_path, temp_json_file)
-                json_found = True
-                print(f"Extracted 'result.json' to {temp_json_file}")
-                break
-        if not json_found:
-            print(f"Error: 'result.json' not found in '{zip_file}'. Exiting.")
-            exit(1)
-except zipfile.BadZipFile:
-    print(f"Error: '{zip_file}' is not a valid ZIP file. Exiting.")
-    exit(1)
-
-# Verify extracted file existence
-if not os.path.exists(temp_json_file):
-    print(f"Error: Failed to extract 'result.json' from '{zip_file}'. Exiting.")
-    exit(1)
-
-# Load JSON data
-print(f"Loading {temp_json_file}")
-with open(temp_json_file, 'r', encoding='utf-8') as f:
-    data = json.load(f)
-
-# Clean up the temporary JSON file
-try:
-    os.remove(temp_json_file)
-    print(f"Removed temporary file: {temp_json_file}")
-except OSError as e:
-    print(f"Warning: Could not remove {temp_json_file}: {e}")
-
-# Access chats list
-chats = data.get('chats', {}).get('list', [])
-print(f"Found {len(chats)} chats in result.json")
-if not chats:
-    print("No chats found in 'result.json'. Exiting.")
-    exit(1)
+# Bump when aggregate_chat changes so cached per-chat aggregates are rebuilt
+aggregate_cache_version = 2
+
+# File extensions for title media and group photos
+media_extensions = ('.mp4', '.webm', '.ogg', '.gif')
+photo_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+# Resized photo derivatives served from docs/img (GIFs keep their originals so they stay animated)
+# Thumbnail strip, title grid and index cards use the small width, the slideshow the large one
+derivative_extensions = ('.jpg', '.jpeg', '.png', '.webp')
+derivative_small_width = 480
+derivative_large_width = 1280
+derivative_quality = 80
+# Bump when the encoding settings change so cached derivatives are re-encoded
+derivative_version = 1
+
+# Command line options
+parser = argparse.ArgumentParser(description='Build the PS ranking pages from a Telegram export.')
+parser.add_argument('--url-cache-ttl', type=float, default=url_cache_ttl_hours, metavar='HOURS',
+                    help=f'hours a cached URL check stays valid, 0 disables the cache (default: {url_cache_ttl_hours})')
+parser.add_argument('--no-aggregate-cache', action='store_true',
+                    help='re-aggregate every chat instead of reusing cached aggregates for chats whose JSON text is unchanged')
+parser.add_argument('--no-stream', action='store_true',
+                    help='load the whole export with json.load instead of streaming it one chat at a time')
+parser.add_argument('--workers', type=int, default=1, metavar='N',
+                    help='processes used to aggregate chats and render group pages, 0 for one per CPU (default: 1)')
+parser.add_argument('--raw-base', default=github_raw_base, metavar='URL',
+                    help=f'base URL the Photos/ assets are checked and linked under (default: {github_raw_base})')
+parser.add_argument('--offline', action='store_true',
+                    help=f'resolve asset URLs against files tracked by git under {photos_folder}/ instead of HTTP HEAD requests')
+parser.add_argument('--compact-history', action='store_true',
+                    help='rewrite the rank history with one row per group and day (and weekly rows for old days with --weekly-after), then exit')
+parser.add_argument('--weekly-after', type=int, default=0, metavar='DAYS',
+                    help='with --compact-history, keep only the latest row per group and ISO week for days older than this, 0 to keep every day (default: 0)')
+parser.add_argument('--no-derivatives', action='store_true',
+                    help=f'reference the original photos instead of the resized copies in {image_folder}/')
+parser.add_argument('--scoring', default=scoring_config_file, metavar='FILE',
+                    help=f'JSON file with the scoring weights and named what-if weightings (default: {scoring_config_file})')
+parser.add_argument('--what-if', nargs='*', metavar='NAME',
+                    help=f're-rank the cached aggregates in {aggregate_cache_file} under the named what-if weightings (all when none are named), print the rank changes and exit')
+parser.add_argument('--profile', nargs='?', const=profile_file, metavar='FILE',
+                    help=f'run under cProfile, print the top functions and dump the stats to FILE (default: {profile_file}); pool workers are not profiled')
+
+# Parsed command line options (set by main, and by init_worker in pool workers)
+args = None
+
+# Function to sanitize filenames
+def sanitize_filename(name):
+    name = re.sub(r'[^\w\s-]', '', name)
+    name = re.sub(r'\s+', '_', name)
+    return name.lower()
+
+# Function to write a generated file only when its content hash differs from the file on disk
+# Unchanged outputs keep their mtime, so deploys do not churn; returns True when the file was written
+def write_if_changed(path, content):
+    data = content.encode('utf-8')
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, 'rb') as f:
+                if hashlib.sha1(f.read()).digest() == hashlib.sha1(data).digest():
+                    return False
+    except OSError:
+        pass
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+# Patterns for the streaming export reader
+json_whitespace = re.compile(r'\s*')
+chat_type_head = re.compile(r'\{\s*(?:"(?:name|id)"\s*:\s*(?:"[^"\\]*(?:\\.[^"\\]*)*"|-?\d+)\s*,\s*)*"type"\s*:\s*"([^"\\]*)"')
+
+# Decoder that steps over a value without building it (every object decodes to None)
+skip_decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: None)
+
+# Function to stream chats.list out of a Telegram export one chat at a time
+# Only the current chat is held in memory; chats of another type are skipped without being built
+# With raw=True the chat's JSON text is yielded instead, for decoding in a pool worker
+def iter_export_chats(f, counts, chat_type='private_supergroup', raw=False, chunk_size=1 << 20):
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    # Read more of the stream, at least doubling the unread part so large chats cost linear time
+    def fill():
+        nonlocal buf, eof
+        if eof:
+            return False
+        chunk = f.read(max(chunk_size, len(buf) - pos))
+        if not chunk:
+            eof = True
+            return False
+        buf += chunk
+        return True
+
+    def peek():
+        nonlocal pos
+        while True:
+            pos = json_whitespace.match(buf, pos).end()
+            if pos < len(buf) or not fill():
+                return buf[pos] if pos < len(buf) else ''
+
+    def expect(char):
+        nonlocal pos
+        if peek() != char:
+            raise ValueError(f"Malformed export: expected {char!r} at offset {pos}")
+        pos += 1
+
+    # Decode the value at pos, reading more until it is complete
+    def decode_value(value_decoder):
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                value, end = value_decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if not fill():
+                    raise
+                continue
+            # A number that runs into the end of the buffer may continue in the next chunk
+            if end == len(buf) and fill():
+                continue
+            pos = end
+            return value
+
+    # Walk an object's keys up to the one named `key`
+    def find_key(key):
+        nonlocal pos
+        expect('{')
+        while peek() != '}':
+            if decode_value(decoder) == key:
+                expect(':')
+                return True
+            expect(':')
+            decode_value(skip_decoder)
+            if peek() == ',':
+                pos += 1
+        return False
+
+    if not find_key('chats') or not find_key('list'):
+        return
+    expect('[')
+    while peek() != ']':
+        while len(buf) - pos < 4096 and fill():
+            pass
+        counts['chats'] += 1
+        start = pos
+        head = chat_type_head.match(buf, pos)
+        if head and (head.group(1) != chat_type or raw):
+            decode_value(skip_decoder)
+            if head.group(1) == chat_type:
+                yield buf[start:pos]
+        else:
+            chat = decode_value(decoder)
+            if chat.get('type') == chat_type:
+                if raw:
+                    chat = buf[start:pos]
+                yield chat
+            del chat
+        buf = buf[pos:]
+        pos = 0
+        if peek() == ',':
+            pos += 1
+
+# Function to load chats.list in one go (the --no-stream fallback)
+def load_export_chats(f, counts, chat_type='private_supergroup'):
+    chats = json.load(f).get('chats', {}).get('list', [])
+    counts['chats'] = len(chats)
+    for chat in chats:
+        if chat.get('type') == chat_type:
+            yield chat
+
+# Hashtags counted case-insensitively (other hashtags keep their original spelling)
+special_ratings = ['#FIVE', '#FOUR', '#THREE']
+special_scene_types = ['#FM', '#FF', '#FFM', '#FFFM', '#FFFFM', '#FMM', '#FMMM', '#FMMMM', '#FFMM', '#FFFMMM', '#ORGY']
+special_hashtags = frozenset(special_ratings + special_scene_types)
+
+# Function to convert an ISO message date to a Unix timestamp (exports without date_unixtime)
+def iso_unixtime(date_str):
+    try:
+        return int(datetime.fromisoformat(date_str).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+# Function to aggregate a chat in a single pass over its messages
+# Returns the compact per-group record the rest of the script works from
+def aggregate_chat(chat):
+    total_messages = 0
+    hashtag_counts = {}
+    newest_date = None
+    titles = []
+    serial_number = 1
+    for message in chat.get('messages', []):
+        if message.get('type') == 'message':
+            total_messages += 1
+            text = message.get('text', '')
+            if isinstance(text, list):
+                for entity in text:
+                    if isinstance(entity, dict) and entity.get('type') == 'hashtag':
+                        hashtag = entity.get('text')
+                        if hashtag:
+                            hashtag_upper = hashtag.upper()
+                            if hashtag_upper in special_hashtags:
+                                hashtag = hashtag_upper
+                            hashtag_counts[hashtag] = hashtag_counts.get(hashtag, 0) + 1
+            try:
+                message_date = int(message['date_unixtime'])
+            except (KeyError, TypeError, ValueError):
+                message_date = iso_unixtime(message.get('date'))
+            if message_date is not None and (newest_date is None or message_date > newest_date):
+                newest_date = message_date
+        elif message.get('action') == 'topic_created':
+            title = message.get('title', '')
+            message_id = message.get('id')
+            date_str = message.get('date', '')
+            if title.strip() and message_id and date_str:
+                try:
+                    date = datetime.fromisoformat(date_str).strftime('%Y-%m-%d')
+                except ValueError:
+                    continue
+                titles.append({
+                    'title': title,
+                    'message_id': message_id,
+                    'date': date,
+                    'serial_number': serial_number
+                })
+                serial_number += 1
+    return {
+        'group name': chat.get('name', 'Unknown Group'),
+        'group id': str(chat['id']),
+        'total messages': total_messages,
+        'hashtag counts': hashtag_counts,
+        'newest date': newest_date,
+        'titles': titles
+    }
+
+# Function to fingerprint a chat from its raw JSON text: length plus SHA-1 of the text
+# Any new message, edit or rename changes it, and it needs no decoding
+def chat_tail_key(text):
+    return f"{len(text)}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+# Function to aggregate one chat, reusing its cached aggregate when the chat text is unchanged
+# Accepts the raw JSON text (decoded only on a cache miss) or an already decoded chat (never reused)
+def process_chat(chat):
+    tail_key = None
+    if isinstance(chat, str):
+        tail_key = chat_tail_key(chat)
+        cached = aggregate_cache.get(tail_key)
+        if cached:
+            print(f"Reusing cached aggregate for group: {cached['group name']} (ID: {cached['group id']})")
+            return dict(cached), tail_key, True
+        chat = json.loads(chat)
+    print(f"Processing group: {chat.get('name', 'Unknown Group')} (ID: {chat['id']})")
+    return aggregate_chat(chat), tail_key, False
+
+# Per-chat aggregates from the previous run, keyed by the fingerprint of the chat text
+aggregate_cache = {}
 
 # Define CSV columns
 csv_columns = [
@@ -94,465 +336,1259 @@ csv_columns = [
 # Define history CSV columns
 history_columns = ['date', 'group name', 'rank']
 
-# Load existing history data
-history_data = {}
-current_date = datetime.now().strftime('%Y-%m-%d')
-if os.path.exists(history_csv_file):
+# Function to read history.csv as (group, date, rank) rows, skipping rows without a valid rank
+def read_history_csv():
+    rows = []
     with open(history_csv_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+        for row in csv.DictReader(f):
             group = row.get('group name', 'Unknown')
             date = row.get('date', '')
             try:
-                rank = int(row.get('rank', '0'))
-                if group not in history_data:
-                    history_data[group] = {}
-                if date != current_date:
-                    if date not in history_data[group] or rank < history_data[group][date]['rank']:
-                        history_data[group][date] = {'date': date, 'rank': rank}
+                rows.append((group, date, int(row.get('rank', '0'))))
             except (ValueError, TypeError) as e:
                 print(f"Skipping invalid rank for group '{group}' on date '{date}': {row}. Error: {e}")
-    for group in history_data:
-        history_data[group] = list(history_data[group].values())
-        history_data[group].sort(key=lambda x: x['date'])
-    print(f"Loaded {sum(len(v) for v in history_data.values())} history entries from {history_csv_file}")
-else:
-    print(f"No existing {history_csv_file} found")
-
-# Initialize data storage
-all_data = []
-max_messages = 0
-date_diffs = []
+    return rows
 
-# Function to sanitize filenames
-def sanitize_filename(name):
-    name = re.sub(r'[^\w\s-]', '', name)
-    name = re.sub(r'\s+', '_', name)
-    return name.lower()
+# Function to reduce history rows to one per (group, date) with the best rank, sorted by date and rank
+# Days older than weekly_after_days (when above 0) are thinned to the latest day per group and ISO week
+def compact_history_rows(rows, current_date, weekly_after_days):
+    best = {}
+    for group, date, rank in rows:
+        if (group, date) not in best or rank < best[(group, date)]:
+            best[(group, date)] = rank
+    kept = {}
+    cutoff = (datetime.strptime(current_date, '%Y-%m-%d') - timedelta(days=weekly_after_days)).strftime('%Y-%m-%d')
+    for (group, date), rank in best.items():
+        key = (group, date)
+        if weekly_after_days > 0 and date < cutoff:
+            try:
+                key = (group, datetime.strptime(date, '%Y-%m-%d').isocalendar()[:2])
+            except ValueError:
+                pass
+        if key not in kept or date > kept[key][1]:
+            kept[key] = (group, date, rank)
+    return sorted(kept.values(), key=lambda row: (row[1], row[2], row[0]))
 
-# Function to check if URL is accessible
-def is_url_accessible(url):
+# Function to compact history.csv and the history store in place (--compact-history)
+def compact_history(current_date, weekly_after_days):
+    if os.path.exists(history_csv_file):
+        rows = read_history_csv()
+        compacted = compact_history_rows(rows, current_date, weekly_after_days)
+        # Write a temporary file and swap it in, so an interrupted run never leaves a partial history
+        tmp_file = history_csv_file + '.tmp'
+        with open(tmp_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(history_columns)
+            writer.writerows((date, group, rank) for group, date, rank in compacted)
+        os.replace(tmp_file, history_csv_file)
+        print(f"Compacted {history_csv_file}: {len(rows)} rows -> {len(compacted)} rows")
+    else:
+        print(f"No existing {history_csv_file} found")
+
+    if os.path.exists(history_db_file):
+        history_db = open_history_db()
+        rows = history_db.execute("SELECT group_name, date, rank FROM history").fetchall()
+        kept = {(group, date) for group, date, rank in compact_history_rows(rows, current_date, weekly_after_days)}
+        with history_db:
+            history_db.executemany("DELETE FROM history WHERE group_name = ? AND date = ?",
+                                   [(group, date) for group, date, rank in rows if (group, date) not in kept])
+        history_db.execute("VACUUM")
+        history_db.close()
+        print(f"Compacted {history_db_file}: {len(rows)} rows -> {len(kept)} rows")
+
+# Function to record ranks in the history store; a group ranked twice on one day keeps its best rank
+def store_history(history_db, rows):
+    with history_db:
+        history_db.executemany(
+            "INSERT INTO history (group_name, date, rank) VALUES (?, ?, ?) "
+            "ON CONFLICT (group_name, date) DO UPDATE SET rank = min(rank, excluded.rank)", rows)
+
+# Function to load history.csv into the history store (done once, when the store is created)
+def import_history_csv(history_db):
+    rows = read_history_csv()
+    store_history(history_db, rows)
+    print(f"Imported {len(rows)} rows from {history_csv_file} into {history_db_file}")
+
+# Function to open the SQLite rank history, keyed (and so indexed) on (group, date)
+def open_history_db():
+    new_db = not os.path.exists(history_db_file)
+    history_db = sqlite3.connect(history_db_file)
+    history_db.execute(
+        "CREATE TABLE IF NOT EXISTS history ("
+        "group_name TEXT NOT NULL, date TEXT NOT NULL, rank INTEGER NOT NULL, "
+        "PRIMARY KEY (group_name, date)) WITHOUT ROWID")
+    if new_db and os.path.exists(history_csv_file):
+        import_history_csv(history_db)
+    return history_db
+
+# Function to look up a group's latest rank before today as (rank, date), or None; a single index seek
+def last_history_rank(history_db, group_name, current_date):
+    return history_db.execute(
+        "SELECT rank, date FROM history WHERE group_name = ? AND date != ? ORDER BY date DESC LIMIT 1",
+        (group_name, current_date)).fetchone()
+
+# Function to get a group's rank history for its chart, oldest first
+def rank_history(history_db, group_name, current_date):
+    rows = history_db.execute(
+        "SELECT date, rank FROM history WHERE group_name = ? AND date != ? ORDER BY date",
+        (group_name, current_date))
+    return [{'date': date, 'rank': rank} for date, rank in rows]
+
+# Shared HTTP session so URL checks reuse keep-alive connections
+http_session = requests.Session()
+http_adapter = HTTPAdapter(pool_connections=url_check_workers, pool_maxsize=url_check_workers)
+http_session.mount('https://', http_adapter)
+http_session.mount('http://', http_adapter)
+
+# Accessibility results for this run, keyed by URL
+url_status = {}
+
+# Persistent URL cache and its hit/miss counters for this run
+url_cache = {}
+url_cache_hits = 0
+url_cache_misses = 0
+
+# Function to load the persistent URL cache
+def load_url_cache():
+    global url_cache
+    if args.url_cache_ttl <= 0 or not os.path.exists(url_cache_file):
+        return
     try:
-        response = requests.head(url, timeout=5)
+        with open(url_cache_file, 'r', encoding='utf-8') as f:
+            url_cache = json.load(f)
+        print(f"Loaded {len(url_cache)} cached URL checks from {url_cache_file}")
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read {url_cache_file}, starting with an empty cache: {e}")
+        url_cache = {}
+
+# Git-tracked Photos/ paths for --offline (None when the git index could not be read)
+tracked_photos = None
+
+# Index of Photos/ built once per run by index_photos
+photo_index = None
+
+# Resized derivative file names in docs/img by original photo URL and width (see build_photo_derivatives)
+photo_derivatives = {}
+
+# Function to map a raw GitHub Photos URL back to the local file it serves
+def local_asset_path(url):
+    prefix = f"{github_raw_base}/Photos/"
+    if url.startswith(prefix):
+        return os.path.join(photos_folder, *url[len(prefix):].split('/'))
+    return None
+
+# Function to hash a local file's contents
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Function to check whether a cached URL result is still valid for the local file
+# (size/mtime first, content hash when only the mtime moved, e.g. after a fresh checkout)
+def url_cache_valid(url, entry, now):
+    if now - entry.get('checked', 0) > args.url_cache_ttl * 3600:
+        return False
+    path = local_asset_path(url)
+    if path is None:
+        return True
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != entry.get('size'):
+        return False
+    if stat.st_mtime != entry.get('mtime'):
+        if file_sha1(path) != entry.get('sha1'):
+            return False
+        entry['mtime'] = stat.st_mtime
+    return True
+
+# Function to record a successful check in the persistent cache
+def url_cache_store(url, now):
+    entry = {'checked': now}
+    path = local_asset_path(url)
+    if path is not None:
+        try:
+            stat = os.stat(path)
+            entry.update({'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': file_sha1(path)})
+        except OSError:
+            return
+    url_cache[url] = entry
+
+# Function to write the URL cache back to disk, evicting expired and orphaned entries
+def save_url_cache():
+    if args.url_cache_ttl <= 0:
+        return
+    now = time.time()
+    kept = {url: entry for url, entry in url_cache.items()
+            if now - entry.get('checked', 0) <= args.url_cache_ttl * 3600
+            and (local_asset_path(url) is None or os.path.exists(local_asset_path(url)))}
+    if len(kept) > url_cache_max_entries:
+        newest = sorted(kept, key=lambda url: kept[url]['checked'], reverse=True)[:url_cache_max_entries]
+        kept = {url: kept[url] for url in newest}
+    tmp_file = url_cache_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(kept, f)
+    os.replace(tmp_file, url_cache_file)
+    print(f"Saved {len(kept)} URL checks to {url_cache_file} ({len(url_cache) - len(kept)} evicted)")
+
+# Function to load the set of Photos/ paths tracked in the git index
+def load_tracked_photos():
+    try:
+        result = subprocess.run(['git', 'ls-files', '-z', '--', photos_folder], capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Warning: Could not read the git index ({e}), treating every file in {photos_folder}/ as tracked")
+        return None
+    return {os.path.normpath(path) for path in result.stdout.decode('utf-8', 'surrogateescape').split('\0') if path}
+
+# Function to resolve a URL offline: accessible when its file exists locally and is tracked by git
+def is_tracked_asset(url):
+    path = local_asset_path(url)
+    if path is None or path not in photo_index['files']:
+        return False
+    return tracked_photos is None or os.path.normpath(path) in tracked_photos
+
+# Function to send a single HEAD request over the shared session
+def probe_url(url):
+    try:
+        response = http_session.head(url, timeout=url_check_timeout)
         return response.status_code == 200
     except requests.RequestException:
         return False
 
-# Validate up/down/no-change images
-indicator_images = ['up.png', 'down.png', '0.png']
-for img in indicator_images:
-    img_url = f"{github_raw_base}/Photos/{img}"
-    if is_url_accessible(img_url):
-        print(f"Index indicator image accessible: {img_url}")
-    else:
-        print(f"Index indicator image inaccessible: {img_url}")
-
-# Function to find media file by serial number
-def find_serial_match_media(serial_number, media_files):
-    print(f"Searching for serial number '{serial_number}' in media files: {media_files}")
-    for media in media_files:
-        media_base = os.path.splitext(media)[0]
-        if media_base == str(serial_number):
-            media_url = f"{github_raw_base}/Photos/{group_name}/thumbs/{media}"
-            if is_url_accessible(media_url):
-                print(f"Match found for serial number '{serial_number}': '{media}' at {media_url}")
-                return media
+# Function to check a batch of URLs concurrently, returns {url: accessible}
+# Only accessible results are cached, so a missing asset is re-probed on the next run
+def check_urls_accessible(urls):
+    global url_cache_hits, url_cache_misses
+    pending = [url for url in dict.fromkeys(urls) if url not in url_status]
+    if args.offline:
+        for url in pending:
+            url_status[url] = is_tracked_asset(url)
+        return {url: url_status[url] for url in urls}
+    if args.url_cache_ttl > 0:
+        now = time.time()
+        misses = []
+        for url in pending:
+            entry = url_cache.get(url)
+            if entry is not None and url_cache_valid(url, entry, now):
+                url_status[url] = True
+                url_cache_hits += 1
             else:
-                print(f"Media '{media}' at {media_url} is inaccessible")
+                misses.append(url)
+        url_cache_misses += len(misses)
+        pending = misses
+    if pending:
+        with ThreadPoolExecutor(max_workers=url_check_workers) as executor:
+            for url, accessible in zip(pending, executor.map(probe_url, pending)):
+                url_status[url] = accessible
+        if args.url_cache_ttl > 0:
+            now = time.time()
+            for url in pending:
+                if url_status[url]:
+                    url_cache_store(url, now)
+    return {url: url_status[url] for url in urls}
+
+# Function to check if URL is accessible (uses batch and cached results when available)
+def is_url_accessible(url):
+    return check_urls_accessible([url])[url]
+
+# Function to index Photos/ in one scandir walk, so later lookups never touch the disk
+# 'files' holds every file path, 'covers' maps lowercased top-level names to the real name,
+# and 'groups' holds each group folder's photos and thumbs/ media in directory order,
+# plus 'serials' mapping a thumbnail's base name to its files in media_extensions order
+def index_photos():
+    index = {'files': set(), 'covers': {}, 'groups': {}}
+    if not os.path.isdir(photos_folder):
+        return index
+    with os.scandir(photos_folder) as entries:
+        for entry in entries:
+            if entry.is_file():
+                index['files'].add(entry.path)
+                index['covers'].setdefault(entry.name.lower(), entry.name)
+                continue
+            if not entry.is_dir():
+                continue
+            group = {'photos': [], 'thumbs': [], 'serials': {}}
+            with os.scandir(entry.path) as group_entries:
+                for group_entry in group_entries:
+                    if group_entry.is_file():
+                        index['files'].add(group_entry.path)
+                        if group_entry.name.lower().endswith(photo_extensions):
+                            group['photos'].append(group_entry.name)
+                    elif group_entry.name == 'thumbs' and group_entry.is_dir():
+                        with os.scandir(group_entry.path) as thumb_entries:
+                            for thumb_entry in thumb_entries:
+                                if thumb_entry.is_file():
+                                    index['files'].add(thumb_entry.path)
+                                    if thumb_entry.name.lower().endswith(media_extensions):
+                                        group['thumbs'].append(thumb_entry.name)
+            # The same serial in several formats prefers .mp4, then .webm, .ogg and .gif
+            for media in group['thumbs']:
+                group['serials'].setdefault(os.path.splitext(media)[0], []).append(media)
+            for candidates in group['serials'].values():
+                candidates.sort(key=lambda media: media_extensions.index(os.path.splitext(media)[1].lower()))
+            index['groups'][entry.name] = group
+    return index
+
+# Function to get a group's indexed photos and thumbs (empty when it has no folder)
+def group_photos(group_name):
+    return photo_index['groups'].get(group_name, {'photos': [], 'thumbs': [], 'serials': {}})
+
+# Function to find a group's cover photo Photos/<group>.<ext>, preferring an exact name match
+def find_cover_photo(group_name):
+    for ext in photo_extensions:
+        candidate = f"{group_name}{ext}"
+        if os.path.join(photos_folder, candidate) in photo_index['files']:
+            return candidate, True
+        if candidate.lower() in photo_index['covers']:
+            return photo_index['covers'][candidate.lower()], False
+    return None, False
+
+# Function to list every thumbnail and photo URL a group page may reference
+def collect_group_urls(group_name):
+    group = group_photos(group_name)
+    urls = [f"{github_raw_base}/Photos/{group_name}/thumbs/{f}" for f in group['thumbs']]
+    urls.extend(f"{github_raw_base}/Photos/{group_name}/{f}" for f in group['photos'])
+    return urls
+
+# Function to encode one photo's resized derivatives into the derivative cache
+# Files are named after the photo's content hash, so unchanged photos are never re-encoded
+def make_photo_derivatives(path, image_format):
+    extension = 'webp' if image_format == 'WEBP' else 'jpg'
+    digest = file_sha1(path)[:20]
+    names = {width: f"{digest}-{width}-v{derivative_version}.{extension}" for width in (derivative_small_width, derivative_large_width)}
+    if all(os.path.exists(os.path.join(derivative_folder, name)) for name in names.values()):
+        return names, False
+    try:
+        with Image.open(path) as image:
+            # Let the JPEG decoder downscale while reading; both sides stay at least the large width
+            image.draft('RGB', (derivative_large_width, derivative_large_width))
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha and image_format == 'WEBP' else 'RGB')
+            for width, name in names.items():
+                resized = image
+                if image.width > width:
+                    resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+                tmp_file = os.path.join(derivative_folder, f"{name}.{os.getpid()}.tmp")
+                resized.save(tmp_file, format=image_format, quality=derivative_quality, optimize=True)
+                os.replace(tmp_file, os.path.join(derivative_folder, name))
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"Warning: Could not resize {path}, pages keep the original: {e}")
+        return None, False
+    return names, True
+
+# Function to resize every group photo and cover the pages reference into docs/img
+# Returns {original URL: {width: file name}}; photos that could not be resized are left out
+def build_photo_derivatives(group_names, workers):
+    if Image is None:
+        print("Pillow is not installed, pages reference the original photos")
+        return {}
+    image_format = 'WEBP' if features.check('webp') else 'JPEG'
+    sources = {}
+    for group_name in group_names:
+        for f in group_photos(group_name)['photos']:
+            sources[f"{github_raw_base}/Photos/{group_name}/{f}"] = os.path.join(photos_folder, group_name, f)
+        cover, _ = find_cover_photo(group_name)
+        if cover:
+            sources[f"{github_raw_base}/Photos/{cover}"] = os.path.join(photos_folder, cover)
+    sources = {url: path for url, path in sources.items() if path.lower().endswith(derivative_extensions)}
+    os.makedirs(derivative_folder, exist_ok=True)
+    os.makedirs(image_folder, exist_ok=True)
+
+    start = time.perf_counter()
+    derivatives = {}
+    encoded = 0
+    with worker_pool(workers, (args, {}, {}, None, None, {})) as executor:
+        for url, (names, was_encoded) in zip(sources, pool_map(executor, workers, make_photo_derivatives, sources.values(), repeat(image_format))):
+            if names:
+                derivatives[url] = names
+                encoded += was_encoded
+
+    # Publish the derivatives in docs/img and drop the ones no page uses any more
+    used = {name for names in derivatives.values() for name in names.values()}
+    for name in used:
+        target = os.path.join(image_folder, name)
+        if not os.path.exists(target):
+            shutil.copyfile(os.path.join(derivative_folder, name), target)
+    for folder in (image_folder, derivative_folder):
+        for name in os.listdir(folder):
+            if name not in used:
+                os.remove(os.path.join(folder, name))
+    print(f"Photo derivatives ({image_format}): {len(derivatives)} photos, {encoded} encoded, {len(derivatives) - encoded} cached in {time.perf_counter() - start:.2f}s")
+    return derivatives
+
+# Function to point a Photos/ URL at its resized derivative (the original URL when there is none)
+# prefix is the path from the page to docs/, e.g. '../' for group pages
+def derivative_src(url, width, prefix=''):
+    names = photo_derivatives.get(url)
+    if not names:
+        return url
+    return f"{prefix}img/{names[width]}"
+
+# Function to find media file by serial number (the preferred accessible format wins)
+def find_serial_match_media(group_name, serial_number):
+    for media in group_photos(group_name)['serials'].get(str(serial_number), []):
+        media_url = f"{github_raw_base}/Photos/{group_name}/thumbs/{media}"
+        if is_url_accessible(media_url):
+            return media
+        print(f"Media '{media}' at {media_url} is inaccessible")
     print(f"No accessible match found for serial number '{serial_number}'")
     return None
 
-# Process each chat
-for chat in chats:
-    if chat.get('type') == 'private_supergroup':
-        group_name = chat.get('name', 'Unknown Group')
-        group_id = str(chat['id'])
-        telegram_group_id = group_id[4:] if group_id.startswith('-100') else group_id
-        messages = chat.get('messages', [])
-        print(f"Processing group: {group_name} (ID: {group_id})")
-
-        total_messages = sum(1 for msg in messages if msg.get('type') == 'message')
-        max_messages = max(max_messages, total_messages)
-
-        # Hashtag counting
-        hashtag_counts = {}
-        for message in messages:
-            if message.get('type') == 'message':
-                text = message.get('text', '')
-                if isinstance(text, list):
-                    for entity in text:
-                        if isinstance(entity, dict) and entity.get('type') == 'hashtag':
-                            hashtag = entity.get('text')
-                            if hashtag:
-                                hashtag_upper = hashtag.upper()
-                                special_ratings = ['#FIVE', '#FOUR', '#THREE']
-                                special_scene_types = ['#FM', '#FF', '#FFM', '#FFFM', '#FFFFM', '#FMM', '#FMMM', '#FMMMM', '#FFMM', '#FFFMMM', '#ORGY']
-                                if hashtag_upper in special_ratings + special_scene_types:
-                                    hashtag = hashtag_upper
-                                hashtag_counts[hashtag] = hashtag_counts.get(hashtag, 0) + 1
-
-        # Calculate date_diff
-        dates = []
-        for message in messages:
-            if message.get('type') == 'message':
-                date_str = message.get('date')
-                if date_str:
-                    try:
-                        date = datetime.fromisoformat(date_str)
-                        dates.append(date)
-                    except ValueError:
-                        continue
-        date_diff = None
-        if dates:
-            newest_date = max(dates)
-            today = datetime.now()
-            date_diff = (today - newest_date).days
-            date_diffs.append(date_diff)
-        print(f"Group {group_name}: Total messages = {total_messages}, Date diff = {date_diff}")
-
-        # Hashtag lists
-        special_ratings = ['#FIVE', '#FOUR', '#THREE']
-        special_scene_types = ['#FM', '#FF', '#FFM', '#FFFM', '#FFFFM', '#FMM', '#FMMM', '#FMMMM', '#FFMM', '#FFFMMM', '#ORGY']
-        ratings_hashtag_list = ''.join(f'<li class="hashtag-item">{h}: {hashtag_counts[h]}</li>\n' for h in sorted(hashtag_counts) if h in special_ratings) or '<li>No rating hashtags (#FIVE, #FOUR, #Three) found</li>'
-        scene_types_hashtag_list = ''.join(f'<li class="hashtag-item">{h}: {hashtag_counts[h]}</li>\n' for h in sorted(hashtag_counts) if h in special_scene_types) or '<li>No scene type hashtags found</li>'
-        other_hashtag_list = ''.join(f'<li class="hashtag-item">{h}: {hashtag_counts[h]}</li>\n' for h in sorted(hashtag_counts) if h not in special_ratings and h not in special_scene_types) or '<li>No other hashtags found</li>'
-
-        scene_type_count = sum(hashtag_counts.get(h, 0) for h in special_scene_types)
-        date_diff_text = f'{date_diff} days' if date_diff is not None else 'N/A'
-
-        # Titles with serial numbers
-        titles = []
-        media_extensions = ['.mp4', '.webm', '.ogg', '.gif']
-        group_subfolder = os.path.join(photos_folder, group_name)
-        thumbs_subfolder = os.path.join(group_subfolder, 'thumbs')
-        media_files = [f for f in os.listdir(thumbs_subfolder) if f.lower().endswith(tuple(media_extensions))] if os.path.exists(thumbs_subfolder) else []
-        fallback_photos = [f for f in os.listdir(group_subfolder) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')) and os.path.isfile(os.path.join(group_subfolder, f))] if os.path.exists(group_subfolder) else []
-        print(f"Group {group_name}: Thumbs media files = {media_files}, Fallback photos = {fallback_photos}")
-        serial_number = 1
-        for message in messages:
-            if message.get('action') == 'topic_created':
-                title = message.get('title', '')
-                message_id = message.get('id')
-                date_str = message.get('date', '')
-                if title.strip() and message_id and date_str:
-                    try:
-                        date = datetime.fromisoformat(date_str).strftime('%Y-%m-%d')
-                        media_path = 'https://via.placeholder.com/600x300'
-                        is_gif = False
-                        if media_files:
-                            serial_match = find_serial_match_media(serial_number, media_files)
-                            if serial_match:
-                                media_path = f"{github_raw_base}/Photos/{group_name}/thumbs/{serial_match}"
-                                is_gif = serial_match.lower().endswith('.gif')
-                                print(f"Group {group_name}, Title '{title}' (S.No {serial_number}): Matched media '{serial_match}', selected path {media_path}")
-                        else:
-                            print(f"Group {group_name}, Title '{title}' (S.No {serial_number}): No media files in {thumbs_subfolder}")
-                            if fallback_photos:
-                                random_photo = random.choice(fallback_photos)
-                                media_path = f"{github_raw_base}/Photos/{group_name}/{random_photo}"
-                                is_gif = random_photo.lower().endswith('.gif')
-                                print(f"  Using fallback photo: {media_path}")
-                                if not is_url_accessible(media_path):
-                                    print(f"  Fallback photo inaccessible: {media_path}")
-                                    media_path = 'https://via.placeholder.com/600x300'
-                        titles.append({
-                            'title': title,
-                            'message_id': message_id,
-                            'date': date,
-                            'media_path': media_path,
-                            'is_gif': is_gif,
-                            'serial_number': serial_number
-                        })
-                        serial_number += 1
-                    except ValueError:
-                        continue
-        titles.sort(key=lambda x: x['date'], reverse=True)
-        titles_count = len(titles)
-
-        # Titles grid
-        titles_grid = f"<p>Total Titles: {titles_count}</p><div class='titles-grid' id='titlesGrid'>"
-        for t in titles:
-            media_element = (
-                f"<img src='{t['media_path']}' alt='Media for {t['title']}' style='width:100%;height:300px;object-fit:cover;border-radius:5px;'>"
-                if t['is_gif'] or t['media_path'] == 'https://via.placeholder.com/600x300'
-                else f"<video src='{t['media_path']}' style='width:100%;height:300px;object-fit:cover;border-radius:5px;' loop muted playsinline></video>"
-            )
-            titles_grid += f"""
+# Stylesheets and scripts shared by every page, written once to docs/assets (see write_assets)
+group_page_css = """
+body { font-family: Arial, sans-serif; margin: 20px; background-color: #1e2a44; color: #ffffff; text-align: center; }
+h1, h2 { color: #e6b800; width: 90%; margin: 20px auto; text-align: center; font-size: 36px; }
+.info { background-color: #2a3a5c; padding: 10px; border-radius: 5px; margin-bottom: 20px; width: 90%; margin-left: auto; margin-right: auto; }
+.hashtags { list-style-type: none; padding: 0; }
+.hashtag-item { background-color: #3b4a6b; margin: 5px 0; padding: 5px; border-radius: 3px; display: inline-block; width: 200px; color: #ffffff; }
+.rank-container { 
+    width: 90%; 
+    margin: 20px auto; 
+    display: flex; 
+    justify-content: center; 
+    align-items: center; 
+    gap: 20px; 
+    flex-wrap: wrap; 
+}
+.rank-number { font-size: 48px; font-weight: bold; color: #e6b800; display: inline-block; }
+@keyframes countUp { from { content: "0"; } to { content: attr(data-rank); } }
+.rank-number::before { content: "0"; animation: countUp 2s ease-out forwards; display: inline-block; min-width: 60px; }
+.chart-container { max-width: 400px; width: 100%; background-color: #2a3a5c; padding: 10px; border-radius: 5px; }
+canvas { width: 100% !important; height: auto !important; }
+.titles-grid { 
+    display: grid; 
+    grid-template-columns: repeat(3, 1fr); 
+    gap: 20px; 
+    margin: 20px 0; 
+    width: 100%; 
+    box-sizing: border-box; 
+}
+.grid-item { 
+    background-color: #2a3a5c; 
+    padding: 10px; 
+    border-radius: 5px; 
+    text-align: center; 
+    display: flex; 
+    flex-direction: column; 
+    align-items: center; 
+    width: 100%; 
+    box-sizing: border-box; 
+}
+.grid-item video, .grid-item img { 
+    width: 100%; 
+    height: 300px; 
+    border-radius: 5px; 
+    object-fit: cover; 
+}
+.grid-item .title { 
+    margin: 10px 0 5px; 
+    font-size: 16px; 
+    font-weight: bold; 
+    color: #e6b800; 
+}
+.grid-item .date { 
+    margin: 0; 
+    font-size: 14px; 
+    color: #cccccc; 
+}
+.titles-table { 
+    width: 100%; 
+    margin: 20px 0; 
+    border-collapse: collapse; 
+    background-color: #2a3a5c; 
+}
+.titles-table th, .titles-table td { 
+    padding: 10px; 
+    border: 1px solid #3b4a6b; 
+    text-align: left; 
+    vertical-align: middle; 
+    color: #ffffff; 
+}
+.titles-table th { 
+    background-color: #e6b800; 
+    color: #1e2a44; 
+    cursor: pointer; 
+}
+.titles-table th:hover { 
+    background-color: #b30000; 
+}
+a { color: #e6b800; text-decoration: none; }
+a:hover { color: #b30000; text-decoration: underline; }
+.container { 
+    position: relative; 
+    width: 90%; 
+    margin: 20px auto; 
+    height: auto; 
+    max-height: 600px; 
+    display: block; 
+    overflow: hidden; 
+    background-color: #2a3a5c; 
+}
+.mySlides { 
+    display: none; 
+    width: 100%; 
+    height: auto; 
+    aspect-ratio: 16/9; 
+}
+.mySlides img { 
+    width: 100%; 
+    height: auto; 
+    object-fit: contain; 
+}
+.cursor { cursor: pointer; }
+.prev, .next { 
+    cursor: pointer; 
+    position: absolute; 
+    top: 50%; 
+    transform: translateY(-50%); 
+    width: auto; 
+    padding: 16px; 
+    color: #e6b800; 
+    font-weight: bold; 
+    font-size: 20px; 
+    border-radius: 0 3px 3px 0; 
+    user-select: none; 
+    -webkit-user-select: none; 
+    z-index: 10; 
+}
+.prev { left: 0; }
+.next { right: 0; border-radius: 3px 0 0 3px; }
+.prev:hover, .next:hover { background-color: #b30000; }
+.numbertext { 
+    color: #e6b800; 
+    font-size: 12px; 
+    padding: 8px 12px; 
+    position: absolute; 
+    top: 0; 
+    z-index: 10; 
+}
+.caption-container { 
+    text-align: center; 
+    background-color: #1e2a44; 
+    padding: 2px 16px; 
+    color: #e6b800; 
+}
+.row { 
+    display: flex; 
+    flex-wrap: wrap; 
+    justify-content: center; 
+    margin-top: 10px; 
+}
+.column { 
+    max-width: 100px; 
+    padding: 5px; 
+}
+.demo { 
+    opacity: 0.6; 
+    width: 100%; 
+    height: auto; 
+    object-fit: cover; 
+}
+.active, .demo:hover { opacity: 1; }
+.tab { 
+    overflow: hidden; 
+    margin: 20px auto; 
+    width: 90%; 
+    background-color: #2a3a5c; 
+    border-radius: 5px 5px 0 0; 
+}
+.tab button { 
+    background-color: #2a3a5c; 
+    color: #e6b800; 
+    float: left; 
+    border: none; 
+    outline: none; 
+    cursor: pointer; 
+    padding: 14px 16px; 
+    transition: 0.3s; 
+    font-size: 17px; 
+    width: 50%; 
+}
+.tab button:hover { background-color: #b30000; }
+.tab button.active { background-color: #3b4a6b; }
+.tabcontent { 
+    display: none; 
+    padding: 6px 12px; 
+    border-top: none; 
+    background-color: #2a3a5c; 
+    margin: 0 auto; 
+    width: 90%; 
+    border-radius: 0 0 5px 5px; 
+}
+#Videos { display: block; }
+@media only screen and (max-width: 1200px) { 
+    .titles-grid { grid-template-columns: repeat(3, 1fr); } 
+    .grid-item video, .grid-item img { height: 200px; }
+    h1, .info, .container, .tab, .tabcontent { width: 90%; }
+    .rank-container { width: 90%; }
+}
+@media only screen and (max-width: 768px) { 
+    .titles-grid { grid-template-columns: repeat(3, 1fr); } 
+    .grid-item video, .grid-item img { height: 150px; }
+    .container { width: 90%; max-height: 400px; } 
+    h1 { margin: 10px auto; font-size: 30px; }
+    .info, .tab, .tabcontent, .rank-container { width: 90%; }
+    .rank-container { flex-direction: column; gap: 10px; } 
+    .chart-container { max-width: 100%; } 
+    .column { flex: 0 0 80px; max-width: 80px; } 
+    .mySlides img { object-fit: contain; } 
+    .tab button { font-size: 14px; padding: 10px; }
+}
+"""
+
+group_page_js = """
+let slideIndex = 1;
+showSlides(slideIndex);
+function plusSlides(n) { 
+    clearInterval(autoSlide); 
+    showSlides(slideIndex += n); 
+    autoSlide = setInterval(() => plusSlides(1), 3000); 
+}
+function currentSlide(n) { 
+    clearInterval(autoSlide); 
+    showSlides(slideIndex = n); 
+    autoSlide = setInterval(() => plusSlides(1), 3000); 
+}
+function showSlides(n) {
+    let i;
+    let slides = document.getElementsByClassName("mySlides");
+    let dots = document.getElementsByClassName("demo");
+    let captionText = document.getElementById("caption");
+    if (n > slides.length) { slideIndex = 1 }
+    if (n < 1) { slideIndex = slides.length }
+    for (i = 0; i < slides.length; i++) { 
+        slides[i].style.display = "none"; 
+    }
+    for (i = 0; i < dots.length; i++) { 
+        dots[i].className = dots[i].className.replace(" active", ""); 
+    }
+    slides[slideIndex-1].style.display = "block";
+    dots[slideIndex-1].className += " active";
+    captionText.innerHTML = dots[slideIndex-1].alt;
+}
+let autoSlide = setInterval(() => plusSlides(1), 3000);
+
+function openTab(evt, tabName) {
+    let i, tabcontent, tablinks;
+    tabcontent = document.getElementsByClassName("tabcontent");
+    for (i = 0; i < tabcontent.length; i++) {
+        tabcontent[i].style.display = "none";
+    }
+    tablinks = document.getElementsByClassName("tablinks");
+    for (i = 0; i < tablinks.length; i++) {
+        tablinks[i].className = tablinks[i].className.replace(" active", "");
+    }
+    document.getElementById(tabName).style.display = "block";
+    evt.currentTarget.className += " active";
+}
+
+// Chart.js and the rank history are only fetched once the chart scrolls into view
+function loadScript(src) {
+    return new Promise((resolve, reject) => {
+        const script = document.createElement('script');
+        script.src = src;
+        script.onload = resolve;
+        script.onerror = () => reject(new Error(`Could not load ${src}`));
+        document.head.appendChild(script);
+    });
+}
+
+function drawRankChart(canvas) {
+    Promise.all([
+        fetch(canvas.dataset.history).then(response => response.json()),
+        window.Chart ? null : loadScript(canvas.dataset.chartjs)
+    ]).then(([historyData]) => drawChart(canvas, historyData)).catch(error => {
+        console.error('Error loading rank history:', error);
+    });
+}
+
+function drawChart(canvas, historyData) {
+    const dates = historyData.map(entry => entry.date);
+    const ranks = historyData.map(entry => entry.rank);
+    new Chart(canvas.getContext('2d'), {
+        type: 'line',
+        data: { 
+            labels: dates, 
+            datasets: [{
+                label: 'Rank Over Time', 
+                data: ranks, 
+                borderColor: '#e6b800', 
+                backgroundColor: 'rgba(230, 184, 0, 0.2)', 
+                fill: true, 
+                tension: 0.4 
+            }] 
+        },
+        options: { 
+            scales: { 
+                y: { 
+                    beginAtZero: true, 
+                    title: { display: true, text: 'Rank', color: '#e6b800' }, 
+                    ticks: { stepSize: 1, color: '#ffffff' }, 
+                    suggestedMax: Number(canvas.dataset.suggestedMax),
+                    grid: { color: '#3b4a6b' }
+                }, 
+                x: { 
+                    title: { display: true, text: 'Date', color: '#e6b800' }, 
+                    ticks: { color: '#ffffff' }, 
+                    grid: { color: '#3b4a6b' }
+                } 
+            }, 
+            plugins: { 
+                legend: { display: true, labels: { color: '#e6b800' } } 
+            } 
+        }
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const chartCanvas = document.getElementById('rankChart');
+    if ('IntersectionObserver' in window) {
+        const chartObserver = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                chartObserver.disconnect();
+                drawRankChart(chartCanvas);
+            }
+        });
+        chartObserver.observe(chartCanvas);
+    } else {
+        drawRankChart(chartCanvas);
+    }
+
+    const videos = document.querySelectorAll('.grid-item video');
+    videos.forEach(video => {
+        video.addEventListener('mouseover', () => {
+            video.play().catch(error => {
+                console.error('Error playing video:', error);
+            });
+        });
+        video.addEventListener('mouseout', () => {
+            video.pause();
+        });
+    });
+
+    sortTitlesTable(0, -1);
+});
+
+let titlesSortDirections = [-1, 0, 0];
+function sortTitlesTable(columnIndex, forceDirection) {
+    const tbody = document.getElementById('titlesTableBody');
+    const rows = Array.from(tbody.getElementsByTagName('tr'));
+    const direction = forceDirection !== undefined ? forceDirection : (titlesSortDirections[columnIndex] === 1 ? -1 : 1);
+    rows.sort((a, b) => {
+        let aValue = a.cells[columnIndex].innerText;
+        let bValue = b.cells[columnIndex].innerText;
+        if (columnIndex === 0) { 
+            aValue = parseInt(aValue);
+            bValue = parseInt(bValue);
+            return direction * (aValue - bValue);
+        } else if (columnIndex === 2) { 
+            aValue = new Date(aValue);
+            bValue = new Date(bValue);
+            return direction * (aValue - bValue);
+        } else if (columnIndex === 1) { 
+            return direction * aValue.localeCompare(bValue);
+        }
+        return 0;
+    });
+    while (tbody.firstChild) { 
+        tbody.removeChild(tbody.firstChild); 
+    }
+    rows.forEach(row => tbody.appendChild(row));
+    titlesSortDirections[columnIndex] = direction;
+    titlesSortDirections = titlesSortDirections.map((d, i) => i === columnIndex ? d : 0);
+    sortTitlesGrid(columnIndex, direction);
+}
+
+function sortTitlesGrid(columnIndex, direction) {
+    const grid = document.getElementById('titlesGrid');
+    const items = Array.from(grid.getElementsByClassName('grid-item'));
+    items.sort((a, b) => {
+        let aValue, bValue;
+        if (columnIndex === 0) { 
+            aValue = parseInt(a.querySelector('.date').innerText.split('S.No: ')[1].split(' | ')[0]);
+            bValue = parseInt(b.querySelector('.date').innerText.split('S.No: ')[1].split(' | ')[0]);
+            return direction * (aValue - bValue);
+        } else if (columnIndex === 1) { 
+            aValue = a.querySelector('.title').innerText;
+            bValue = b.querySelector('.title').innerText;
+            return direction * aValue.localeCompare(bValue);
+        } else if (columnIndex === 2) { 
+            aValue = new Date(a.querySelector('.date').innerText.split(' | ')[1]);
+            bValue = new Date(b.querySelector('.date').innerText.split(' | ')[1]);
+            return direction * (aValue - bValue);
+        }
+        return 0;
+    });
+    while (grid.firstChild) { 
+        grid.removeChild(grid.firstChild); 
+    }
+    items.forEach(item => grid.appendChild(item));
+}
+"""
+
+index_page_css = """
+body { font-family: Arial, sans-serif; background-color: #1e2a44; color: #ffffff; margin: 20px; text-align: center; }
+h1, h2 { color: #e6b800; }
+table { width: 80%; margin: 20px auto; border-collapse: collapse; background-color: #2a3a5c; box-shadow: 0 0 10px rgba(0, 0, 0, 0.3); }
+th, td { border: 1px solid #3b4a6b; text-align: center; vertical-align: middle; padding: 15px; color: #ffffff; }
+th { background-color: #e6b800; color: #1e2a44; cursor: pointer; }
+th:hover { background-color: #b30000; }
+tr:hover { background-color: #3b4a6b; }
+.up-down-img { width: 20px; height: 20px; vertical-align: middle; }
+a { text-decoration: none; color: #e6b800; }
+a:hover { color: #b30000; text-decoration: underline; }
+.flip-card { background-color: transparent; width: 300px; height: 300px; perspective: 1000px; margin: 10px auto; }
+.flip-card-inner { position: relative; width: 100%; height: 100%; text-align: center; transition: transform 0.6s; transform-style: preserve-3d; box-shadow: 0 4px 8px 0 rgba(0,0,0,0.2); }
+.flip-card:hover .flip-card-inner { transform: rotateY(180deg); }
+.flip-card-front, .flip-card-back { position: absolute; width: 100%; height: 100%; backface-visibility: hidden; border-radius: 5px; }
+.flip-card-front { background-color: #2a3a5c; color: #ffffff; }
+.flip-card-back { background-color: #3b4a6b; color: #e6b800; transform: rotateY(180deg); display: flex; justify-content: center; align-items: center; flex-direction: column; }
+.flip-card-back h1 { margin: 0; font-size: 24px; word-wrap: break-word; padding: 10px; }
+.mover-info { display: flex; flex-direction: column; align-items: center; gap: 10px; width: 320px; }
+.mover-info p { margin: 5px 0; font-size: 16px; }
+#topMoversTable td { min-width: 340px; }
+@keyframes countUp { from { content: "0"; } to { content: attr(data-rank); } }
+@media only screen and (max-width: 1200px) { 
+    table { width: 90%; } 
+    .flip-card { width: 200px; height: 200px; } 
+    .flip-card-back h1 { font-size: 18px; }
+    th, td { font-size: 14px; padding: 10px; }
+    .mover-info { width: 220px; }
+    .mover-info p { font-size: 14px; }
+    #topMoversTable td { min-width: 240px; }
+}
+@media only screen and (max-width: 768px) { 
+    table { width: 95%; } 
+    .flip-card { width: 150px; height: 150px; } 
+    .flip-card-back h1 { font-size: 16px; }
+    th, td { font-size: 12px; padding: 8px; }
+    .mover-info { width: 170px; }
+    .mover-info p { font-size: 12px; }
+    #topMoversTable td { min-width: 190px; }
+    #topMoversTable { display: block; overflow-x: auto; white-space: nowrap; }
+}
+.pager { margin: 10px auto 20px; display: flex; justify-content: center; align-items: center; gap: 15px; }
+.pager button { background-color: #e6b800; color: #1e2a44; border: none; border-radius: 3px; padding: 8px 16px; font-size: 16px; cursor: pointer; }
+.pager button:hover { background-color: #b30000; color: #ffffff; }
+.pager button:disabled { opacity: 0.4; cursor: default; }
+"""
+
+index_page_js = """
+// The ranking rows are loaded from ranking.json; only the current page of rows is in the DOM
+const pageSize = 50;
+const sortKeys = ['rank', 'lastRank', 'upDown', 'name', null, 'lastScene', 'titles', 'five', 'four', 'three', 'sceneType', 'score'];
+let sortDirections = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0];
+let currentPage = 0;
+let rankingRows = [];
+let upDownImages = {};
+
+function escapeHtml(text) {
+    return String(text).replace(/[&<>"']/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;' })[c]);
+}
+
+function upDownImage(upDown) {
+    if (upDown === null) return upDownImages.none;
+    return upDown > 0 ? upDownImages.up : upDown < 0 ? upDownImages.down : upDownImages.same;
+}
+
+function rowHtml(row) {
+    const name = escapeHtml(row.name);
+    const link = escapeHtml(row.page);
+    const lastRank = row.lastRank === null ? 'N/A' : `${row.lastRank} (${escapeHtml(row.lastRankDate)})`;
+    const lastScene = row.lastScene === null ? 'N/A' : `${row.lastScene} days`;
+    return `<tr>
+        <td>${row.rank}</td>
+        <td>${lastRank}</td>
+        <td>${row.upDown === null ? 'N/A' : row.upDown} <img src="${escapeHtml(upDownImage(row.upDown))}" alt="Up Down" class="up-down-img"></td>
+        <td><a href="${link}" target="_blank">${name}</a></td>
+        <td><div class="flip-card"><div class="flip-card-inner"><div class="flip-card-front"><img src="${escapeHtml(row.photo)}" alt="${name}" loading="lazy" style="width:300px;height:300px;object-fit:cover;"></div><div class="flip-card-back"><a href="${link}" target="_blank" style="color: #e6b800; text-decoration: none;"><h1>${name}</h1></a></div></div></div></td>
+        <td>${lastScene}</td>
+        <td>${row.titles}</td>
+        <td>${row.five}</td>
+        <td>${row.four}</td>
+        <td>${row.three}</td>
+        <td>${row.sceneType}</td>
+        <td>${row.score.toFixed(2)}</td>
+    </tr>`;
+}
+
+function renderTable() {
+    const pageCount = Math.max(1, Math.ceil(rankingRows.length / pageSize));
+    currentPage = Math.min(Math.max(currentPage, 0), pageCount - 1);
+    const start = currentPage * pageSize;
+    document.getElementById('tableBody').innerHTML = rankingRows.slice(start, start + pageSize).map(rowHtml).join('');
+    document.getElementById('pageInfo').textContent = `Page ${currentPage + 1} of ${pageCount}`;
+    document.getElementById('prevPage').disabled = currentPage === 0;
+    document.getElementById('nextPage').disabled = currentPage >= pageCount - 1;
+}
+
+function changePage(step) {
+    currentPage += step;
+    renderTable();
+}
+
+// Missing values (N/A) sort after everything else when ascending
+function compareValues(a, b, direction) {
+    if (a === null && b === null) return 0;
+    if (a === null) return direction;
+    if (b === null) return -direction;
+    if (typeof a === 'string') return direction * a.localeCompare(b);
+    return direction * (a - b);
+}
+
+function sortTable(columnIndex) {
+    const key = sortKeys[columnIndex];
+    if (!key) return;
+    const direction = sortDirections[columnIndex] === 1 ? -1 : 1;
+    rankingRows.sort((a, b) => compareValues(a[key], b[key], direction));
+    sortDirections = sortDirections.map((d, i) => i === columnIndex ? direction : 0);
+    currentPage = 0;
+    renderTable();
+}
+
+fetch(document.getElementById('rankingTable').dataset.src)
+    .then(response => {
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        return response.json();
+    })
+    .then(data => {
+        rankingRows = data.groups;
+        upDownImages = data.upDownImages;
+        renderTable();
+    })
+    .catch(error => {
+        document.getElementById('pageInfo').textContent = `Could not load the ranking: ${error.message}`;
+    });
+"""
+
+# Function to name a shared asset after its content, so browsers can cache it until it changes
+def asset_file_name(name, extension, content):
+    return f"{name}-{hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]}.{extension}"
+
+group_css_file = asset_file_name('group', 'css', group_page_css)
+group_js_file = asset_file_name('group', 'js', group_page_js)
+index_css_file = asset_file_name('index', 'css', index_page_css)
+index_js_file = asset_file_name('index', 'js', index_page_js)
+
+# Function to write the shared assets to docs/assets, removing ones left by older versions
+# Counts written, skipped and removed files in write_counts
+def write_assets(write_counts):
+    os.makedirs(asset_folder, exist_ok=True)
+    assets = {
+        group_css_file: group_page_css,
+        group_js_file: group_page_js,
+        index_css_file: index_page_css,
+        index_js_file: index_page_js
+    }
+    for name, content in assets.items():
+        write_counts['written' if write_if_changed(os.path.join(asset_folder, name), content) else 'skipped'] += 1
+    for name in os.listdir(asset_folder):
+        if name not in assets:
+            os.remove(os.path.join(asset_folder, name))
+            write_counts['removed'] += 1
+    print(f"Wrote shared assets to {asset_folder}: {', '.join(assets)}")
+
+# Function to name a group's page after its sanitized name and id
+def group_html_file(record):
+    return f"{sanitize_filename(record['group name'])}_{record['group id']}.html"
+
+# Function to name a group's rank history file in docs/history
+def group_history_file(record):
+    return f"{sanitize_filename(record['group name'])}_{record['group id']}.json"
+
+# Function to build a group's ranking entry from its aggregate and last rank (score and rank are filled in later)
+def build_group_entry(record, last_rank_row, current_date):
+    group_name = record['group name']
+    hashtag_counts = record['hashtag counts']
+    date_diff = record['date diff']
+
+    # Single photo for group (used in index.html)
+    photo_file_name, exact_match = find_cover_photo(group_name)
+    if photo_file_name:
+        photo_url = f"{github_raw_base}/Photos/{photo_file_name}"
+        print(f"Group {group_name}: Found {'exact' if exact_match else 'case-insensitive'} match photo '{photo_file_name}' at {photo_url}")
+    else:
+        print(f"Group {group_name}: No photo named '{group_name}.{{jpg,jpeg,png,gif,webp}}' or case-insensitive match found in {photos_folder}, using placeholder")
+
+    # Find last rank and its date
+    last_rank, last_rank_date = last_rank_row or ('N/A', 'N/A')
+
+    return {
+        'date': current_date,
+        'group name': group_name,
+        'total messages': record['total messages'],
+        'Datedifference': date_diff if date_diff is not None else 'N/A',
+        'count of the hashtag "#FIVE"': hashtag_counts.get('#FIVE', 0),
+        'count of the hashtag "#FOUR"': hashtag_counts.get('#FOUR', 0),
+        'count of the hashtag "#Three"': hashtag_counts.get('#THREE', 0),
+        'count of the hashtag "#SceneType"': sum(hashtag_counts.get(h, 0) for h in special_scene_types),
+        'score': 0,
+        'rank': 0,
+        'last rank': last_rank,
+        'last rank date': last_rank_date,
+        'up down': 'N/A',
+        'total titles': len(record['titles']),
+        'html_file': group_html_file(record),
+        'photo_file_name': derivative_src(f"{github_raw_base}/Photos/{photo_file_name}", derivative_small_width) if photo_file_name else 'https://via.placeholder.com/300'
+    }
+
+# Default weights of the ranking score: points per hashtag, and the most the message count and recency can add
+# scoring.json overrides them and can name alternative weightings for --what-if
+default_scoring_weights = {'hashtags': {'#FIVE': 10, '#FOUR': 5, '#THREE': 1}, 'messages': 10, 'recency': 10}
+
+# Function to check a weighting read from the scoring config
+def check_scoring_weights(weights, where):
+    hashtags = weights.get('hashtags')
+    if not isinstance(hashtags, dict) or not all(isinstance(weight, (int, float)) for weight in hashtags.values()):
+        raise ValueError(f"{where}: 'hashtags' must map hashtags to numbers")
+    for key in ('messages', 'recency'):
+        if not isinstance(weights.get(key), (int, float)):
+            raise ValueError(f"{where}: '{key}' must be a number")
+    unknown = set(weights) - set(default_scoring_weights)
+    if unknown:
+        raise ValueError(f"{where}: unknown keys {sorted(unknown)}")
+    return weights
+
+# Function to load the scoring config: the weights the ranking uses and the named what-if weightings
+# Each what-if weighting only lists what it changes; missing keys come from the weights
+def load_scoring_config(path):
+    config = {'weights': default_scoring_weights, 'what-if': {}}
+    if not os.path.exists(path):
+        print(f"No {path}, using the default scoring weights")
+        return config
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            loaded = json.load(f)
+        config['weights'] = check_scoring_weights({**default_scoring_weights, **loaded.get('weights', {})}, path)
+        config['what-if'] = {name: check_scoring_weights({**config['weights'], **weights}, f"{path} what-if '{name}'")
+                             for name, weights in loaded.get('what-if', {}).items()}
+    except (OSError, ValueError, AttributeError, TypeError) as e:
+        print(f"Error: Could not load scoring config {path}: {e}. Exiting.")
+        exit(1)
+    print(f"Loaded scoring weights from {path} ({len(config['what-if'])} what-if weightings)")
+    return config
+
+# Function to count whole days between a group's newest message and the run
+def days_since(newest_date, now):
+    return None if newest_date is None else int((now - newest_date) // 86400)
+
+# Function to pack the per-group counts the score is computed from into columns (NumPy arrays when available)
+def score_columns(records, hashtags):
+    columns = {hashtag: [record['hashtag counts'].get(hashtag, 0) for record in records] for hashtag in hashtags}
+    columns['messages'] = [record['total messages'] for record in records]
+    columns['dated'] = [record['date diff'] is not None for record in records]
+    columns['date diff'] = [record['date diff'] or 0 for record in records]
+    if np is not None:
+        columns = {key: np.array(values, dtype=bool if key == 'dated' else np.int64) for key, values in columns.items()}
+    return columns
+
+# Function to score every group from its packed columns under a weighting
+# Returns the hashtag, messages and recency parts and their total, each in record order
+def score_groups(columns, weights):
+    messages = columns['messages']
+    dated = columns['dated']
+    date_diffs = columns['date diff']
+    if np is not None:
+        hashtag_scores = sum((weight * columns[hashtag] for hashtag, weight in weights['hashtags'].items()), np.zeros(len(messages), dtype=np.int64))
+        max_messages = messages.max(initial=0)
+        messages_scores = (messages / max_messages) * weights['messages'] if max_messages > 0 else np.zeros(len(messages))
+        date_scores = np.zeros(len(messages))
+        if dated.any():
+            dated_diffs = date_diffs[dated]
+            min_date_diff = dated_diffs.min()
+            max_date_diff_denom = dated_diffs.max() - min_date_diff or 1
+            date_scores[dated] = weights['recency'] * (1 - (dated_diffs - min_date_diff) / max_date_diff_denom)
+        return hashtag_scores, messages_scores, date_scores, hashtag_scores + messages_scores + date_scores
+
+    # Pure-Python fallback, same arithmetic in the same order
+    hashtag_scores = [sum(weight * columns[hashtag][i] for hashtag, weight in weights['hashtags'].items()) for i in range(len(messages))]
+    max_messages = max(messages, default=0)
+    messages_scores = [(count / max_messages) * weights['messages'] if max_messages > 0 else 0.0 for count in messages]
+    dated_diffs = [diff for diff, has_date in zip(date_diffs, dated) if has_date]
+    min_date_diff = min(dated_diffs, default=0)
+    max_date_diff_denom = max(dated_diffs, default=0) - min_date_diff or 1
+    date_scores = [weights['recency'] * (1 - (diff - min_date_diff) / max_date_diff_denom) if has_date else 0.0 for diff, has_date in zip(date_diffs, dated)]
+    return hashtag_scores, messages_scores, date_scores, [h + m + d for h, m, d in zip(hashtag_scores, messages_scores, date_scores)]
+
+# Function to order groups by score, highest first; equal scores keep record order like a stable sort
+def rank_order(scores):
+    if np is not None:
+        return np.argsort(-scores, kind='stable').tolist()
+    return sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+
+# Function to re-rank the cached aggregates under what-if weightings and print how each group's rank moves
+# Nothing is parsed from the export and no page is written
+def what_if(config, names):
+    names = names or list(config['what-if'])
+    if not names:
+        print(f"Error: No what-if weightings named on the command line or in {args.scoring}. Exiting.")
+        exit(1)
+    unknown = [name for name in names if name not in config['what-if']]
+    if unknown:
+        print(f"Error: Unknown what-if weightings {unknown}; {args.scoring} defines {sorted(config['what-if'])}. Exiting.")
+        exit(1)
+    try:
+        with open(aggregate_cache_file, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not read {aggregate_cache_file} (run rank.py once to build it): {e}. Exiting.")
+        exit(1)
+    if cached.get('version') != aggregate_cache_version:
+        print(f"Error: {aggregate_cache_file} was written by a different aggregate version, run rank.py to rebuild it. Exiting.")
+        exit(1)
+
+    now = time.time()
+    records = [dict(entry['record'], **{'date diff': days_since(entry['record']['newest date'], now)}) for entry in cached['chats'].values()]
+    weightings = [config['weights']] + [config['what-if'][name] for name in names]
+    columns = score_columns(records, {hashtag for weights in weightings for hashtag in weights['hashtags']})
+    print(f"Re-ranking {len(records)} groups from {aggregate_cache_file}")
+
+    # Rank of each group under each weighting, the configured weights first
+    ranks = []
+    for name, weights in zip(['current'] + names, weightings):
+        started = time.perf_counter()
+        order = rank_order(score_groups(columns, weights)[3])
+        elapsed = (time.perf_counter() - started) * 1000
+        group_ranks = [0] * len(records)
+        for rank, i in enumerate(order, 1):
+            group_ranks[i] = rank
+        ranks.append(group_ranks)
+        if name != 'current':
+            moves = [abs(base - rank) for base, rank in zip(ranks[0], group_ranks)]
+            print(f"What-if '{name}': {sum(1 for move in moves if move)} groups move, largest move {max(moves, default=0)}, ranked in {elapsed:.2f} ms")
+
+    # Comparison table of the groups whose rank changes in any weighting, in current rank order
+    widths = [max(len(name), 9) for name in names]
+    print('\n' + '  '.join(['Rank'.rjust(5)] + [name.rjust(width) for name, width in zip(names, widths)] + ['Group']))
+    moved = 0
+    for i in sorted(range(len(records)), key=ranks[0].__getitem__):
+        if all(group_ranks[i] == ranks[0][i] for group_ranks in ranks[1:]):
+            continue
+        moved += 1
+        cells = [f"{group_ranks[i]} ({ranks[0][i] - group_ranks[i]:+d})" if group_ranks[i] != ranks[0][i] else f"{group_ranks[i]} (=)" for group_ranks in ranks[1:]]
+        print('  '.join([str(ranks[0][i]).rjust(5)] + [cell.rjust(width) for cell, width in zip(cells, widths)] + [records[i]['group name']]))
+    print(f"{moved} of {len(records)} groups change rank; the rest keep their current rank")
+
+# Function to render a group page with its final rank and write it to docs/HTML
+def render_group_page(record, rank, group_history, suggested_max):
+    group_name = record['group name']
+    group_id = record['group id']
+    telegram_group_id = group_id[4:] if group_id.startswith('-100') else group_id
+    total_messages = record['total messages']
+    hashtag_counts = record['hashtag counts']
+    date_diff = record['date diff']
+
+    # Hashtag lists
+    ratings_hashtag_list = ''.join(f'<li class="hashtag-item">{h}: {hashtag_counts[h]}</li>\n' for h in sorted(hashtag_counts) if h in special_ratings) or '<li>No rating hashtags (#FIVE, #FOUR, #Three) found</li>'
+    scene_types_hashtag_list = ''.join(f'<li class="hashtag-item">{h}: {hashtag_counts[h]}</li>\n' for h in sorted(hashtag_counts) if h in special_scene_types) or '<li>No scene type hashtags found</li>'
+    other_hashtag_list = ''.join(f'<li class="hashtag-item">{h}: {hashtag_counts[h]}</li>\n' for h in sorted(hashtag_counts) if h not in special_ratings and h not in special_scene_types) or '<li>No other hashtags found</li>'
+
+    date_diff_text = f'{date_diff} days' if date_diff is not None else 'N/A'
+
+    # Titles with serial numbers
+    titles = []
+    group_subfolder = os.path.join(photos_folder, group_name)
+    thumbs_subfolder = os.path.join(group_subfolder, 'thumbs')
+    group = group_photos(group_name)
+    media_files = group['thumbs']
+    fallback_photos = group['photos']
+    print(f"Group {group_name}: {len(media_files)} thumbs media files, {len(fallback_photos)} fallback photos")
+    for title_info in record['titles']:
+        title = title_info['title']
+        serial_number = title_info['serial_number']
+        media_path = 'https://via.placeholder.com/600x300'
+        is_gif = False
+        if media_files:
+            serial_match = find_serial_match_media(group_name, serial_number)
+            if serial_match:
+                media_path = f"{github_raw_base}/Photos/{group_name}/thumbs/{serial_match}"
+                is_gif = serial_match.lower().endswith('.gif')
+                print(f"Group {group_name}, Title '{title}' (S.No {serial_number}): Matched media '{serial_match}', selected path {media_path}")
+        else:
+            print(f"Group {group_name}, Title '{title}' (S.No {serial_number}): No media files in {thumbs_subfolder}")
+            if fallback_photos:
+                # Seeded per title so unchanged pages render identically from run to run
+                random_photo = random.Random(f"{group_name}:{serial_number}").choice(fallback_photos)
+                media_path = f"{github_raw_base}/Photos/{group_name}/{random_photo}"
+                is_gif = random_photo.lower().endswith('.gif')
+                print(f"  Using fallback photo: {media_path}")
+                if not is_url_accessible(media_path):
+                    print(f"  Fallback photo inaccessible: {media_path}")
+                    media_path = 'https://via.placeholder.com/600x300'
+                else:
+                    media_path = derivative_src(media_path, derivative_small_width, '../')
+        titles.append(dict(title_info, media_path=media_path, is_gif=is_gif))
+    titles.sort(key=lambda x: x['date'], reverse=True)
+    titles_count = len(titles)
+
+    # Titles grid (pieces are collected in a list and joined once)
+    titles_grid = [f"<p>Total Titles: {titles_count}</p><div class='titles-grid' id='titlesGrid'>"]
+    for t in titles:
+        media_element = (
+            f"<img src='{t['media_path']}' alt='Media for {t['title']}' style='width:100%;height:300px;object-fit:cover;border-radius:5px;'>"
+            if t['is_gif'] or t['media_path'] == 'https://via.placeholder.com/600x300'
+            else f"<video src='{t['media_path']}' style='width:100%;height:300px;object-fit:cover;border-radius:5px;' loop muted playsinline></video>"
+        )
+        titles_grid.append(f"""
                 <div class='grid-item'>
                     {media_element}
                     <p class='title'><a href='https://t.me/c/{telegram_group_id}/{t['message_id']}' target='_blank'>{t['title']}</a></p>
                     <p class='date'>S.No: {t['serial_number']} | {t['date']}</p>
                 </div>
-            """
-        titles_grid += f"</div>" if titles else f"<p>No titles found (Total: {titles_count})</p>"
-
-        # Titles table
-        titles_table = f"<table class='titles-table' id='titlesTable'><thead><tr><th onclick='sortTitlesTable(0)'>S.No</th><th onclick='sortTitlesTable(1)'>Items</th><th onclick='sortTitlesTable(2)'>Date</th></tr></thead><tbody id='titlesTableBody'>"
-        for t in titles:
-            titles_table += f"<tr><td>{t['serial_number']}</td><td><a href='https://t.me/c/{telegram_group_id}/{t['message_id']}' target='_blank'>{t['title']}</a></td><td>{t['date']}</td></tr>"
-        titles_table += f"</tbody></table>" if titles else f"<p>No titles found</p>"
-
-        # Photos for slideshow
-        photo_paths = []
-        if os.path.exists(group_subfolder):
-            photo_paths = [f"{github_raw_base}/Photos/{group_name}/{f}" for f in os.listdir(group_subfolder) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')) and os.path.isfile(os.path.join(group_subfolder, f))]
-            photo_paths = [p for p in photo_paths if is_url_accessible(p)]
-            print(f"Group {group_name}: Found {len(photo_paths)} accessible photos in {group_subfolder}: {photo_paths}")
-        if not photo_paths:
-            photo_paths = ['https://via.placeholder.com/1920x800']
-            print(f"Group {group_name}: Using placeholder for slideshow")
-
-        slideshow_content = '<div class="container">\n' + ''.join(f'<div class="mySlides"><div class="numbertext">{i} / {len(photo_paths)}</div><img src="{p}" style="width:100%;height:auto;"></div>' for i, p in enumerate(photo_paths, 1)) + """
+            """)
+    titles_grid.append(f"</div>" if titles else f"<p>No titles found (Total: {titles_count})</p>")
+    titles_grid = ''.join(titles_grid)
+
+    # Titles table
+    titles_table = [f"<table class='titles-table' id='titlesTable'><thead><tr><th onclick='sortTitlesTable(0)'>S.No</th><th onclick='sortTitlesTable(1)'>Items</th><th onclick='sortTitlesTable(2)'>Date</th></tr></thead><tbody id='titlesTableBody'>"]
+    titles_table.extend(f"<tr><td>{t['serial_number']}</td><td><a href='https://t.me/c/{telegram_group_id}/{t['message_id']}' target='_blank'>{t['title']}</a></td><td>{t['date']}</td></tr>" for t in titles)
+    titles_table.append(f"</tbody></table>" if titles else f"<p>No titles found</p>")
+    titles_table = ''.join(titles_table)
+
+    # Photos for slideshow
+    photo_paths = []
+    if group_name in photo_index['groups']:
+        photo_paths = [f"{github_raw_base}/Photos/{group_name}/{f}" for f in fallback_photos]
+        photo_paths = [p for p in photo_paths if is_url_accessible(p)]
+        print(f"Group {group_name}: Found {len(photo_paths)} accessible photos in {group_subfolder}: {photo_paths}")
+    if not photo_paths:
+        photo_paths = ['https://via.placeholder.com/1920x800']
+        print(f"Group {group_name}: Using placeholder for slideshow")
+
+    slideshow_content = '<div class="container">\n' + ''.join(f'<div class="mySlides"><div class="numbertext">{i} / {len(photo_paths)}</div><img src="{derivative_src(p, derivative_large_width, "../")}" style="width:100%;height:auto;"></div>' for i, p in enumerate(photo_paths, 1)) + """
             <a class="prev" onclick="plusSlides(-1)">❮</a>
             <a class="next" onclick="plusSlides(1)">❯</a>
             <div class="caption-container"><p id="caption"></p></div>
             <div class="row">
-        """ + ''.join(f'<div class="column"><img class="demo cursor" src="{p}" style="width:100%" onclick="currentSlide({i})" alt="{group_name} Photo {i}"></div>' for i, p in enumerate(photo_paths, 1)) + '</div></div>'
-
-        # Single photo for group (used in index.html)
-        photo_file_name = None
-        if os.path.exists(photos_folder):
-            group_name_lower = group_name.lower()
-            for ext in ('.jpg', '.jpeg', '.png', '.gif', '.webp'):
-                candidate = f"{group_name}{ext}"
-                candidate_lower = f"{group_name_lower}{ext}"
-                # Check exact match
-                if os.path.exists(os.path.join(photos_folder, candidate)):
-                    photo_file_name = candidate
-                    photo_url = f"{github_raw_base}/Photos/{candidate}"
-                    print(f"Group {group_name}: Found exact match photo '{candidate}' at {photo_url}")
-                    break
-                # Check case-insensitive match
-                elif os.path.exists(os.path.join(photos_folder, candidate_lower)):
-                    photo_file_name = candidate_lower
-                    photo_url = f"{github_raw_base}/Photos/{candidate_lower}"
-                    print(f"Group {group_name}: Found case-insensitive match photo '{candidate_lower}' at {photo_url}")
-                    break
-            if not photo_file_name:
-                print(f"Group {group_name}: No photo named '{group_name}.{{jpg,jpeg,png,gif,webp}}' or case-insensitive match found in {photos_folder}, using placeholder")
-        else:
-            print(f"Group {group_name}: No Photos folder {photos_folder}, using placeholder")
-
-        if group_name not in history_data:
-            history_data[group_name] = []
+        """ + ''.join(f'<div class="column"><img class="demo cursor" src="{derivative_src(p, derivative_small_width, "../")}" style="width:100%" onclick="currentSlide({i})" alt="{group_name} Photo {i}"></div>' for i, p in enumerate(photo_paths, 1)) + '</div></div>'
 
-        history_data_json = json.dumps(history_data.get(group_name, []))
+    # Rank history for the chart, fetched by the page when the chart scrolls into view
+    history_json = json.dumps(group_history, separators=(',', ':'))
+    history_file = group_history_file(record)
+    history_path = os.path.join(history_subfolder, history_file)
+    history_src = f"../history/{history_file}?v={hashlib.sha1(history_json.encode('utf-8')).hexdigest()[:12]}"
 
-        # HTML content for group pages
-        html_content = f"""<!DOCTYPE html>
+    # HTML content for group pages
+    html_content = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{group_name}</title>
-    <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.2/dist/chart.umd.min.js"></script>
     <style>
-        body {{ font-family: Arial, sans-serif; margin: 20px; background-color: #1e2a44; color: #ffffff; text-align: center; }}
-        h1, h2 {{ color: #e6b800; width: 90%; margin: 20px auto; text-align: center; font-size: 36px; }}
-        .info {{ background-color: #2a3a5c; padding: 10px; border-radius: 5px; margin-bottom: 20px; width: 90%; margin-left: auto; margin-right: auto; }}
-        .hashtags {{ list-style-type: none; padding: 0; }}
-        .hashtag-item {{ background-color: #3b4a6b; margin: 5px 0; padding: 5px; border-radius: 3px; display: inline-block; width: 200px; color: #ffffff; }}
-        .rank-container {{ 
-            width: 90%; 
-            margin: 20px auto; 
-            display: flex; 
-            justify-content: center; 
-            align-items: center; 
-            gap: 20px; 
-            flex-wrap: wrap; 
-        }}
-        .rank-number {{ font-size: 48px; font-weight: bold; color: #e6b800; display: inline-block; }}
-        @keyframes countUp {{ from {{ content: "0"; }} to {{ content: attr(data-rank); }} }}
-        .rank-number::before {{ content: "0"; animation: countUp 2s ease-out forwards; display: inline-block; min-width: 60px; }}
-        .chart-container {{ max-width: 400px; width: 100%; background-color: #2a3a5c; padding: 10px; border-radius: 5px; }}
-        canvas {{ width: 100% !important; height: auto !important; }}
-        .titles-grid {{ 
-            display: grid; 
-            grid-template-columns: repeat(3, 1fr); 
-            gap: 20px; 
-            margin: 20px 0; 
-            width: 100%; 
-            box-sizing: border-box; 
-        }}
-        .grid-item {{ 
-            background-color: #2a3a5c; 
-            padding: 10px; 
-            border-radius: 5px; 
-            text-align: center; 
-            display: flex; 
-            flex-direction: column; 
-            align-items: center; 
-            width: 100%; 
-            box-sizing: border-box; 
-        }}
-        .grid-item video, .grid-item img {{ 
-            width: 100%; 
-            height: 300px; 
-            border-radius: 5px; 
-            object-fit: cover; 
-        }}
-        .grid-item .title {{ 
-            margin: 10px 0 5px; 
-            font-size: 16px; 
-            font-weight: bold; 
-            color: #e6b800; 
-        }}
-        .grid-item .date {{ 
-            margin: 0; 
-            font-size: 14px; 
-            color: #cccccc; 
-        }}
-        .titles-table {{ 
-            width: 100%; 
-            margin: 20px 0; 
-            border-collapse: collapse; 
-            background-color: #2a3a5c; 
-        }}
-        .titles-table th, .titles-table td {{ 
-            padding: 10px; 
-            border: 1px solid #3b4a6b; 
-            text-align: left; 
-            vertical-align: middle; 
-            color: #ffffff; 
-        }}
-        .titles-table th {{ 
-            background-color: #e6b800; 
-            color: #1e2a44; 
-            cursor: pointer; 
-        }}
-        .titles-table th:hover {{ 
-            background-color: #b30000; 
-        }}
-        a {{ color: #e6b800; text-decoration: none; }}
-        a:hover {{ color: #b30000; text-decoration: underline; }}
-        .container {{ 
-            position: relative; 
-            width: 90%; 
-            margin: 20px auto; 
-            height: auto; 
-            max-height: 600px; 
-            display: block; 
-            overflow: hidden; 
-            background-color: #2a3a5c; 
-        }}
-        .mySlides {{ 
-            display: none; 
-            width: 100%; 
-            height: auto; 
-            aspect-ratio: 16/9; 
-        }}
-        .mySlides img {{ 
-            width: 100%; 
-            height: auto; 
-            object-fit: contain; 
-        }}
-        .cursor {{ cursor: pointer; }}
-        .prev, .next {{ 
-            cursor: pointer; 
-            position: absolute; 
-            top: 50%; 
-            transform: translateY(-50%); 
-            width: auto; 
-            padding: 16px; 
-            color: #e6b800; 
-            font-weight: bold; 
-            font-size: 20px; 
-            border-radius: 0 3px 3px 0; 
-            user-select: none; 
-            -webkit-user-select: none; 
-            z-index: 10; 
-        }}
-        .prev {{ left: 0; }}
-        .next {{ right: 0; border-radius: 3px 0 0 3px; }}
-        .prev:hover, .next:hover {{ background-color: #b30000; }}
-        .numbertext {{ 
-            color: #e6b800; 
-            font-size: 12px; 
-            padding: 8px 12px; 
-            position: absolute; 
-            top: 0; 
-            z-index: 10; 
-        }}
-        .caption-container {{ 
-            text-align: center; 
-            background-color: #1e2a44; 
-            padding: 2px 16px; 
-            color: #e6b800; 
-        }}
-        .row {{ 
-            display: flex; 
-            flex-wrap: wrap; 
-            justify-content: center; 
-            margin-top: 10px; 
-        }}
-        .column {{ 
-            flex: 0 0 {100 / len(photo_paths) if photo_paths else 100}%; 
-            max-width: 100px; 
-            padding: 5px; 
-        }}
-        .demo {{ 
-            opacity: 0.6; 
-            width: 100%; 
-            height: auto; 
-            object-fit: cover; 
-        }}
-        .active, .demo:hover {{ opacity: 1; }}
-        .tab {{ 
-            overflow: hidden; 
-            margin: 20px auto; 
-            width: 90%; 
-            background-color: #2a3a5c; 
-            border-radius: 5px 5px 0 0; 
-        }}
-        .tab button {{ 
-            background-color: #2a3a5c; 
-            color: #e6b800; 
-            float: left; 
-            border: none; 
-            outline: none; 
-            cursor: pointer; 
-            padding: 14px 16px; 
-            transition: 0.3s; 
-            font-size: 17px; 
-            width: 50%; 
-        }}
-        .tab button:hover {{ background-color: #b30000; }}
-        .tab button.active {{ background-color: #3b4a6b; }}
-        .tabcontent {{ 
-            display: none; 
-            padding: 6px 12px; 
-            border-top: none; 
-            background-color: #2a3a5c; 
-            margin: 0 auto; 
-            width: 90%; 
-            border-radius: 0 0 5px 5px; 
-        }}
-        #Videos {{ display: block; }}
-        @media only screen and (max-width: 1200px) {{ 
-            .titles-grid {{ grid-template-columns: repeat(3, 1fr); }} 
-            .grid-item video, .grid-item img {{ height: 200px; }}
-            h1, .info, .container, .tab, .tabcontent {{ width: 90%; }}
-            .rank-container {{ width: 90%; }}
-        }}
-        @media only screen and (max-width: 768px) {{ 
-            .titles-grid {{ grid-template-columns: repeat(3, 1fr); }} 
-            .grid-item video, .grid-item img {{ height: 150px; }}
-            .container {{ width: 90%; max-height: 400px; }} 
-            h1 {{ margin: 10px auto; font-size: 30px; }}
-            .info, .tab, .tabcontent, .rank-container {{ width: 90%; }}
-            .rank-container {{ flex-direction: column; gap: 10px; }} 
-            .chart-container {{ max-width: 100%; }} 
-            .column {{ flex: 0 0 80px; max-width: 80px; }} 
-            .mySlides img {{ object-fit: contain; }} 
-            .tab button {{ font-size: 14px; padding: 10px; }}
-        }}
+        .column {{ flex: 0 0 {100 / len(photo_paths) if photo_paths else 100}%; }}
     </style>
+    <link rel="stylesheet" href="../assets/{group_css_file}">
 </head>
 <body>
     <h1>{group_name}</h1>
     <div class="rank-container">
-        <div class="chart-container"><h2>Rank History</h2><canvas id="rankChart"></canvas></div>
-        <p>Rank: <span class="rank-number" data-rank="RANK_PLACEHOLDER"></span></p>
+        <div class="chart-container"><h2>Rank History</h2><canvas id="rankChart" data-history="{history_src}" data-suggested-max="{suggested_max}" data-chartjs="{chartjs_url}"></canvas></div>
+        <p>Rank: <span class="rank-number" data-rank="{rank}"></span></p>
     </div>
     {slideshow_content}
     <div class="info"><p>Scenes: {total_messages}</p><p>Last Scene: {date_diff_text}</p></div>
@@ -574,283 +1610,386 @@ for chat in chats:
             {titles_table}
         </div>
     </div>
-    <script>
-        let slideIndex = 1;
-        showSlides(slideIndex);
-        function plusSlides(n) {{ 
-            clearInterval(autoSlide); 
-            showSlides(slideIndex += n); 
-            autoSlide = setInterval(() => plusSlides(1), 3000); 
-        }}
-        function currentSlide(n) {{ 
-            clearInterval(autoSlide); 
-            showSlides(slideIndex = n); 
-            autoSlide = setInterval(() => plusSlides(1), 3000); 
-        }}
-        function showSlides(n) {{
-            let i;
-            let slides = document.getElementsByClassName("mySlides");
-            let dots = document.getElementsByClassName("demo");
-            let captionText = document.getElementById("caption");
-            if (n > slides.length) {{ slideIndex = 1 }}
-            if (n < 1) {{ slideIndex = slides.length }}
-            for (i = 0; i < slides.length; i++) {{ 
-                slides[i].style.display = "none"; 
-            }}
-            for (i = 0; i < dots.length; i++) {{ 
-                dots[i].className = dots[i].className.replace(" active", ""); 
-            }}
-            slides[slideIndex-1].style.display = "block";
-            dots[slideIndex-1].className += " active";
-            captionText.innerHTML = dots[slideIndex-1].alt;
-        }}
-        let autoSlide = setInterval(() => plusSlides(1), 3000);
-
-        function openTab(evt, tabName) {{
-            let i, tabcontent, tablinks;
-            tabcontent = document.getElementsByClassName("tabcontent");
-            for (i = 0; i < tabcontent.length; i++) {{
-                tabcontent[i].style.display = "none";
-            }}
-            tablinks = document.getElementsByClassName("tablinks");
-            for (i = 0; i < tablinks.length; i++) {{
-                tablinks[i].className = tablinks[i].className.replace(" active", "");
-            }}
-            document.getElementById(tabName).style.display = "block";
-            evt.currentTarget.className += " active";
-        }}
-
-        document.addEventListener('DOMContentLoaded', function() {{
-            const ctx = document.getElementById('rankChart').getContext('2d');
-            const historyData = {history_data_json};
-            const dates = historyData.map(entry => entry.date);
-            const ranks = historyData.map(entry => entry.rank);
-            new Chart(ctx, {{
-                type: 'line',
-                data: {{ 
-                    labels: dates, 
-                    datasets: [{{
-                        label: 'Rank Over Time', 
-                        data: ranks, 
-                        borderColor: '#e6b800', 
-                        backgroundColor: 'rgba(230, 184, 0, 0.2)', 
-                        fill: true, 
-                        tension: 0.4 
-                    }}] 
-                }},
-                options: {{ 
-                    scales: {{ 
-                        y: {{ 
-                            beginAtZero: true, 
-                            title: {{ display: true, text: 'Rank', color: '#e6b800' }}, 
-                            ticks: {{ stepSize: 1, color: '#ffffff' }}, 
-                            suggestedMax: {len(chats) + 1},
-                            grid: {{ color: '#3b4a6b' }}
-                        }}, 
-                        x: {{ 
-                            title: {{ display: true, text: 'Date', color: '#e6b800' }}, 
-                            ticks: {{ color: '#ffffff' }}, 
-                            grid: {{ color: '#3b4a6b' }}
-                        }} 
-                    }}, 
-                    plugins: {{ 
-                        legend: {{ display: true, labels: {{ color: '#e6b800' }} }} 
-                    }} 
-                }}
-            }});
-
-            const videos = document.querySelectorAll('.grid-item video');
-            videos.forEach(video => {{
-                video.addEventListener('mouseover', () => {{
-                    video.play().catch(error => {{
-                        console.error('Error playing video:', error);
-                    }});
-                }});
-                video.addEventListener('mouseout', () => {{
-                    video.pause();
-                }});
-            }});
-
-            sortTitlesTable(0, -1);
-        }});
-
-        let titlesSortDirections = [-1, 0, 0];
-        function sortTitlesTable(columnIndex, forceDirection) {{
-            const tbody = document.getElementById('titlesTableBody');
-            const rows = Array.from(tbody.getElementsByTagName('tr'));
-            const direction = forceDirection !== undefined ? forceDirection : (titlesSortDirections[columnIndex] === 1 ? -1 : 1);
-            rows.sort((a, b) => {{
-                let aValue = a.cells[columnIndex].innerText;
-                let bValue = b.cells[columnIndex].innerText;
-                if (columnIndex === 0) {{ 
-                    aValue = parseInt(aValue);
-                    bValue = parseInt(bValue);
-                    return direction * (aValue - bValue);
-                }} else if (columnIndex === 2) {{ 
-                    aValue = new Date(aValue);
-                    bValue = new Date(bValue);
-                    return direction * (aValue - bValue);
-                }} else if (columnIndex === 1) {{ 
-                    return direction * aValue.localeCompare(bValue);
-                }}
-                return 0;
-            }});
-            while (tbody.firstChild) {{ 
-                tbody.removeChild(tbody.firstChild); 
-            }}
-            rows.forEach(row => tbody.appendChild(row));
-            titlesSortDirections[columnIndex] = direction;
-            titlesSortDirections = titlesSortDirections.map((d, i) => i === columnIndex ? d : 0);
-            sortTitlesGrid(columnIndex, direction);
-        }}
-
-        function sortTitlesGrid(columnIndex, direction) {{
-            const grid = document.getElementById('titlesGrid');
-            const items = Array.from(grid.getElementsByClassName('grid-item'));
-            items.sort((a, b) => {{
-                let aValue, bValue;
-                if (columnIndex === 0) {{ 
-                    aValue = parseInt(a.querySelector('.date').innerText.split('S.No: ')[1].split(' | ')[0]);
-                    bValue = parseInt(b.querySelector('.date').innerText.split('S.No: ')[1].split(' | ')[0]);
-                    return direction * (aValue - bValue);
-                }} else if (columnIndex === 1) {{ 
-                    aValue = a.querySelector('.title').innerText;
-                    bValue = b.querySelector('.title').innerText;
-                    return direction * aValue.localeCompare(bValue);
-                }} else if (columnIndex === 2) {{ 
-                    aValue = new Date(a.querySelector('.date').innerText.split(' | ')[1]);
-                    bValue = new Date(b.querySelector('.date').innerText.split(' | ')[1]);
-                    return direction * (aValue - bValue);
-                }}
-                return 0;
-            }});
-            while (grid.firstChild) {{ 
-                grid.removeChild(grid.firstChild); 
-            }}
-            items.forEach(item => grid.appendChild(item));
-        }}
-    </script>
+    <script src="../assets/{group_js_file}"></script>
 </body>
 </html>
 """
 
-        # Find last rank and its date
-        last_rank = 'N/A'
-        last_rank_date = 'N/A'
-        if group_name in history_data and history_data[group_name]:
-            sorted_history = sorted(history_data[group_name], key=lambda x: x['date'], reverse=True)
-            last_rank = sorted_history[0]['rank']
-            last_rank_date = sorted_history[0]['date']
-
-        sanitized_name = sanitize_filename(group_name)
-        html_file = f"{sanitized_name}_{group_id}.html"
-        html_filename = os.path.join(html_subfolder, html_file)
-
-        all_data.append({
-            'date': current_date,
-            'group name': group_name,
-            'total messages': total_messages,
-            'Datedifference': date_diff if date_diff is not None else 'N/A',
-            'count of the hashtag "#FIVE"': hashtag_counts.get('#FIVE', 0),
-            'count of the hashtag "#FOUR"': hashtag_counts.get('#FOUR', 0),
-            'count of the hashtag "#Three"': hashtag_counts.get('#THREE', 0),
-            'count of the hashtag "#SceneType"': scene_type_count,
-            'score': 0,
-            'rank': 0,
-            'last rank': last_rank,
-            'last rank date': last_rank_date,
-            'up down': 'N/A',
-            'total titles': titles_count,
-            'html_file': html_file,
-            'html_content': html_content,
-            'photo_file_name': f"{github_raw_base}/Photos/{photo_file_name}" if photo_file_name else 'https://via.placeholder.com/300'
-        })
-
-# Calculate scores
-min_date_diff = min(date_diffs) if date_diffs else 0
-max_date_diff_denom = max(date_diffs) - min_date_diff if date_diffs and max(date_diffs) > min_date_diff else 1
-
-for entry in all_data:
-    five_count = entry['count of the hashtag "#FIVE"']
-    four_count = entry['count of the hashtag "#FOUR"']
-    three_count = entry['count of the hashtag "#Three"']
-    messages = entry['total messages']
-    diff = entry['Datedifference']
-    hashtag_score = (10 * five_count) + (5 * four_count) + (1 * three_count)
-    messages_score = (messages / max_messages) * 10 if max_messages > 0 else 0
-    date_score = 0
-    if diff != 'N/A' and date_diffs:
-        date_score = 10 * (1 - (diff - min_date_diff) / max_date_diff_denom) if max_date_diff_denom > 0 else 10
-    entry['score'] = hashtag_score + messages_score + date_score
-
-# Sort by score and assign ranks
-sorted_data = sorted(all_data, key=lambda x: x['score'], reverse=True)
-for i, entry in enumerate(sorted_data, 1):
-    entry['rank'] = i
-    if entry['last rank'] != 'N/A':
-        entry['up down'] = int(entry['last rank']) - i
-    history_data[entry['group name']].append({'date': current_date, 'rank': i})
-    html_content_with_rank = entry['html_content'].replace('RANK_PLACEHOLDER', str(i))
-    html_path = os.path.join(html_subfolder, entry['html_file'])
-    with open(html_path, 'w', encoding='utf-8') as f:
-        f.write(html_content_with_rank)
-    print(f"Wrote HTML file: {html_path}")
-
-# Write current run to output.csv
-csv_data = [{k: v for k, v in entry.items() if k in csv_columns} for entry in sorted_data]
-with open(csv_file, 'w', newline='', encoding='utf-8') as f:
-    writer = csv.DictWriter(f, fieldnames=csv_columns)
+    # Returns the files written and the seconds spent writing them
+    html_path = os.path.join(html_subfolder, group_html_file(record))
+    write_started = time.perf_counter()
+    page_files = [(history_path, write_if_changed(history_path, history_json)), (html_path, write_if_changed(html_path, html_content))]
+    return page_files, time.perf_counter() - write_started
+
+# Function to set up module state in a pool worker (spawned workers do not inherit the parent's globals)
+def init_worker(worker_args, worker_aggregate_cache, worker_url_status, worker_tracked_photos, worker_photo_index, worker_photo_derivatives):
+    global args, github_raw_base, aggregate_cache, tracked_photos, photo_index, photo_derivatives
+    args = worker_args
+    github_raw_base = args.raw_base.rstrip('/')
+    aggregate_cache = worker_aggregate_cache
+    url_status.update(worker_url_status)
+    tracked_photos = worker_tracked_photos
+    photo_index = worker_photo_index
+    photo_derivatives = worker_photo_derivatives
+
+# Function to open a process pool, or nothing when running with a single worker
+def worker_pool(workers, initargs):
+    if workers <= 1:
+        return contextlib.nullcontext()
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs)
+
+# Function to map func over zipped iterables like map(), in the pool when there is one
+# Results come back in input order; only a couple of tasks per worker are queued at a time,
+# so streamed chats are never all held in memory
+def pool_map(executor, workers, func, *iterables):
+    if executor is None:
+        for job in zip(*iterables):
+            result = func(*job)
+            del job
+            yield result
+        return
+    pending = deque()
+    for job in zip(*iterables):
+        pending.append(executor.submit(func, *job))
+        del job
+        if len(pending) >= 2 * workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+# Wall-clock seconds spent in each stage of the run, for run_report.json
+stage_timings = {}
+stage_started = 0
+
+# Function to close the running stage: the time since the previous call is added to `name`
+def end_stage(name):
+    global stage_started
+    now = time.perf_counter()
+    stage_timings[name] = stage_timings.get(name, 0) + now - stage_started
+    stage_started = now
+
+# Function to pass items through while adding the time spent producing each one to a stage
+def timed_iter(iterable, name):
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            stage_timings[name] = stage_timings.get(name, 0) + time.perf_counter() - started
+        yield item
+
+# Function to call func and also return the seconds it took (times per-group work, in pool workers too)
+def timed_call(func, *func_args):
+    started = time.perf_counter()
+    result = func(*func_args)
+    return result, time.perf_counter() - started
+
+# Function to write run_report.json: stage timings, per-group timings slowest first, and output counts
+def write_run_report(group_timings, write_counts):
+    total = sum(stage_timings.values())
+    groups = sorted(group_timings.values(), key=lambda group: group['aggregate seconds'] + group['render seconds'], reverse=True)
+    report = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'workers': args.workers,
+        'groups': len(groups),
+        'total seconds': round(total, 4),
+        'stages': {name: round(seconds, 4) for name, seconds in stage_timings.items()},
+        'output files': dict(write_counts),
+        'url cache': {'hits': url_cache_hits, 'misses': url_cache_misses},
+        'group timings': [dict(group, **{key: round(group[key], 4) for key in ('aggregate seconds', 'render seconds', 'write seconds')}) for group in groups]
+    }
+    with open(run_report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"\nRun took {total:.2f}s: " + ', '.join(f"{name} {seconds:.2f}s" for name, seconds in stage_timings.items()))
+    for group in groups[:5]:
+        print(f"  Slow group {group['group name']}: aggregate {group['aggregate seconds']:.3f}s, render {group['render seconds']:.3f}s")
+    print(f"Wrote run report {run_report_file}")
+
+# Build the ranking pages from PS/result.zip (under cProfile with --profile)
+def main(argv=None):
+    global args, github_raw_base
+    args = parser.parse_args(argv)
+    github_raw_base = args.raw_base.rstrip('/')
+    if args.workers == 0:
+        args.workers = os.cpu_count() or 1
+    if not args.profile:
+        build_ranking()
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(build_ranking)
+    finally:
+        profiler.dump_stats(args.profile)
+        print(f"\nProfile stats written to {args.profile} (top functions by cumulative time):")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+# Function to run the whole pipeline: aggregate the export, score, and write the pages, data and history
+def build_ranking():
+    global aggregate_cache, tracked_photos, photo_index, photo_derivatives, stage_started
+    stage_timings.clear()
+    stage_started = time.perf_counter()
+
+    # Ensure directories exist
+    for folder in [input_folder, output_folder, html_subfolder, history_subfolder, photos_folder, cache_folder]:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+            print(f"Created directory: {folder}")
+        else:
+            print(f"Directory already exists: {folder}")
+
+    # History maintenance mode: compact the rank history and stop
+    if args.compact_history:
+        compact_history(datetime.now().strftime('%Y-%m-%d'), args.weekly_after)
+        return
+
+    # Load the scoring weights; in what-if mode re-rank the cached aggregates and stop
+    scoring = load_scoring_config(args.scoring)
+    if args.what_if is not None:
+        what_if(scoring, args.what_if)
+        return
+
+    end_stage('setup')
+
+    # Verify ZIP file existence
+    if not os.path.exists(zip_file):
+        print(f"Error: 'result.zip' not found in '{input_folder}'. Exiting.")
+        exit(1)
+
+    # Load cached per-chat aggregates from the previous run
+    aggregate_cache = {}
+    if not args.no_aggregate_cache and os.path.exists(aggregate_cache_file):
+        try:
+            with open(aggregate_cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('version') == aggregate_cache_version:
+                aggregate_cache = {entry['tail']: entry['record'] for entry in cached.get('chats', {}).values()}
+                print(f"Loaded {len(aggregate_cache)} cached chat aggregates from {aggregate_cache_file}")
+            else:
+                print(f"Ignoring {aggregate_cache_file}: written by a different aggregate version")
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read {aggregate_cache_file}, re-aggregating every chat: {e}")
+
+    # Aggregate each private supergroup as it is read; messages are dropped once counted
+    # Chats are read as raw JSON text, fingerprinted against the cache and only decoded on a miss
+    # (in the pool workers with --workers)
+    records = []
+    run_started = time.time()
+    chat_counts = {'chats': 0}
+    new_aggregate_cache = {}
+    aggregates_reused = 0
+    try:
+        zip_ref = zipfile.ZipFile(zip_file, 'r')
+    except zipfile.BadZipFile:
+        print(f"Error: '{zip_file}' is not a valid ZIP file. Exiting.")
+        exit(1)
+    json_info = next((info for info in zip_ref.infolist() if info.filename.endswith('result.json')), None)
+    if json_info is None:
+        print(f"Error: 'result.json' not found in '{zip_file}'. Exiting.")
+        exit(1)
+    print(f"Loading '{json_info.filename}' from {zip_file}{'' if args.no_stream else ' (streaming)'}")
+    group_timings = {}
+    end_stage('extract')
+    with zip_ref, zip_ref.open(json_info) as raw, io.TextIOWrapper(raw, encoding='utf-8') as f:
+        if args.no_stream:
+            chats = load_export_chats(f, chat_counts)
+        else:
+            chats = iter_export_chats(f, chat_counts, raw=args.workers > 1 or not args.no_aggregate_cache)
+        with worker_pool(args.workers, (args, aggregate_cache, {}, None, None, {})) as executor:
+            for (record, tail_key, reused), seconds in pool_map(executor, args.workers, timed_call, repeat(process_chat), timed_iter(chats, 'json load')):
+                group_timings[record['group id']] = {'group name': record['group name'], 'group id': record['group id'], 'messages': record['total messages'],
+                                                     'reused': reused, 'aggregate seconds': seconds, 'render seconds': 0, 'write seconds': 0}
+                new_aggregate_cache[record['group id']] = {'tail': tail_key, 'record': dict(record)}
+                aggregates_reused += reused
+
+                date_diff = days_since(record['newest date'], run_started)
+                record['date diff'] = date_diff
+                records.append(record)
+                print(f"Group {record['group name']}: Total messages = {record['total messages']}, Date diff = {date_diff}")
+
+    print(f"Found {chat_counts['chats']} chats in result.json ({len(records)} private supergroups)")
+    if not chat_counts['chats']:
+        print("No chats found in 'result.json'. Exiting.")
+        exit(1)
+    print(f"Aggregate cache: {aggregates_reused} reused, {len(records) - aggregates_reused} re-aggregated")
+    # The loop's wall time less the time spent reading chats out of the export
+    end_stage('aggregate')
+    stage_timings['aggregate'] -= stage_timings.get('json load', 0)
+
+    # Pack the counts the score is computed from
+    columns = score_columns(records, scoring['weights']['hashtags'])
+
+    # Save the per-chat aggregates for the next run (chats no longer in the export drop out)
+    # --no-stream decodes the whole export up front, so there is no chat text to fingerprint
+    if not args.no_aggregate_cache and not args.no_stream:
+        tmp_file = aggregate_cache_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': aggregate_cache_version, 'chats': new_aggregate_cache}, f, ensure_ascii=False)
+        os.replace(tmp_file, aggregate_cache_file)
+        print(f"Saved {len(new_aggregate_cache)} chat aggregates to {aggregate_cache_file}")
+    del new_aggregate_cache
+    end_stage('aggregate cache save')
+
+    # Open the rank history store (history.csv is imported into it the first time)
+    current_date = datetime.now().strftime('%Y-%m-%d')
+    history_db = open_history_db()
+    print(f"Opened rank history {history_db_file}")
+    end_stage('history load')
+
+    # Index Photos/ once; every photo and thumbnail lookup below is served from it
+    photo_index = index_photos()
+    print(f"Indexed {len(photo_index['files'])} files in {photos_folder}/ ({len(photo_index['groups'])} group folders)")
+    end_stage('photo index')
+
+    # Load the persistent URL cache and, for --offline, the git index
+    load_url_cache()
+    if args.offline:
+        tracked_photos = load_tracked_photos()
+        if tracked_photos is not None:
+            print(f"Offline mode: {len(tracked_photos)} files tracked in {photos_folder}/")
+
+    # Check all candidate URLs up front
+    indicator_images = ['up.png', 'down.png', '0.png']
+    candidate_urls = [f"{github_raw_base}/Photos/{img}" for img in indicator_images]
+    for record in records:
+        candidate_urls.extend(collect_group_urls(record['group name']))
+    url_check_start = time.perf_counter()
+    url_results = check_urls_accessible(candidate_urls)
+    url_check_method = 'against the git index' if args.offline else f'with {url_check_workers} workers'
+    print(f"Checked {len(url_results)} URLs ({sum(url_results.values())} accessible) {url_check_method} in {time.perf_counter() - url_check_start:.2f}s")
+
+    # Validate up/down/no-change images
+    for img in indicator_images:
+        img_url = f"{github_raw_base}/Photos/{img}"
+        if url_results[img_url]:
+            print(f"Index indicator image accessible: {img_url}")
+        else:
+            print(f"Index indicator image inaccessible: {img_url}")
+    end_stage('url checks')
+
+    # Resize the photos the pages reference into docs/img
+    if not args.no_derivatives:
+        photo_derivatives = build_photo_derivatives([record['group name'] for record in records], args.workers)
+        end_stage('derivatives')
+
+    # Build each group's ranking entry (one history index seek per group for its last rank)
+    all_data = [build_group_entry(record, last_history_rank(history_db, record['group name'], current_date), current_date) for record in records]
+
+    end_stage('entries')
+
+    # Calculate scores (vectorized with NumPy when it is installed)
+    hashtag_scores, messages_scores, date_scores, scores = score_groups(columns, scoring['weights'])
+    order = rank_order(scores)
+    if np is not None:
+        hashtag_scores, messages_scores, date_scores, scores = (part.tolist() for part in (hashtag_scores, messages_scores, date_scores, scores))
+    for entry, hashtag_score, messages_score, date_score, score in zip(all_data, hashtag_scores, messages_scores, date_scores, scores):
+        entry['score'] = score
+        entry['score components'] = {'hashtags': hashtag_score, 'messages': messages_score, 'recency': date_score}
+
+    # Sort by score and assign ranks
+    sorted_data = [all_data[i] for i in order]
+    for i, entry in enumerate(sorted_data, 1):
+        entry['rank'] = i
+        if entry['last rank'] != 'N/A':
+            entry['up down'] = int(entry['last rank']) - i
+    end_stage('score')
+
+    # Render and write each group page now that its rank is known (they link the shared assets)
+    # Pages are written as they are rendered, so only one is held in memory per worker
+    write_counts = Counter()
+    write_assets(write_counts)
+    end_stage('write')
+    ranks = [entry['rank'] for entry in all_data]
+    group_histories = (rank_history(history_db, record['group name'], current_date) for record in records)
+    page_seconds = {'render': 0, 'write': 0}
+    with worker_pool(args.workers, (args, {}, url_status, tracked_photos, photo_index, photo_derivatives)) as executor:
+        for record, ((page_files, write_seconds), seconds) in zip(records, pool_map(executor, args.workers, timed_call, repeat(render_group_page), records, ranks, group_histories, repeat(chat_counts['chats'] + 1))):
+            group_timings[record['group id']]['render seconds'] = seconds - write_seconds
+            group_timings[record['group id']]['write seconds'] = write_seconds
+            page_seconds['render'] += seconds - write_seconds
+            page_seconds['write'] += write_seconds
+            for path, written in page_files:
+                write_counts['written' if written else 'skipped'] += 1
+                print(f"{'Wrote' if written else 'Unchanged'} file: {path}")
+    # Pages are written as they are rendered, so the loop's wall time is split between the two stages
+    # in the proportion the per-group timers measured (pool workers overlap, so their sums exceed the wall time)
+    end_stage('render')
+    if page_seconds['write']:
+        write_share = page_seconds['write'] / (page_seconds['render'] + page_seconds['write'])
+        stage_timings['write'] += stage_timings['render'] * write_share
+        stage_timings['render'] -= stage_timings['render'] * write_share
+
+    # Remove pages and history files of groups that are no longer in the export
+    for folder, extension, current_files in ((html_subfolder, '.html', {group_html_file(record) for record in records}),
+                                             (history_subfolder, '.json', {group_history_file(record) for record in records})):
+        for name in os.listdir(folder):
+            if name.endswith(extension) and name not in current_files:
+                os.remove(os.path.join(folder, name))
+                write_counts['removed'] += 1
+                print(f"Removed stale file: {os.path.join(folder, name)}")
+    end_stage('write')
+    store_history(history_db, [(entry['group name'], current_date, entry['rank']) for entry in sorted_data])
+    history_db.close()
+    print(f"Stored {len(sorted_data)} ranks for {current_date} in {history_db_file}")
+
+    # Write current run to output.csv
+    csv_data = [{k: v for k, v in entry.items() if k in csv_columns} for entry in sorted_data]
+    csv_buffer = io.StringIO(newline='')
+    writer = csv.DictWriter(csv_buffer, fieldnames=csv_columns)
     writer.writeheader()
     writer.writerows(csv_data)
-print(f"\nWrote CSV file: {csv_file}")
-
-# Append new history entries to history.csv
-new_history_rows = [{'date': current_date, 'group name': entry['group name'], 'rank': entry['rank']} for entry in sorted_data]
-new_history_rows = [row for row in new_history_rows if row.get('group name') and row.get('rank') is not None]
-if new_history_rows:
-    write_header = not os.path.exists(history_csv_file)
-    with open(history_csv_file, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=history_columns)
-        if write_header:
-            writer.writeheader()
-        writer.writerows(new_history_rows)
-    print(f"\nAppended {len(new_history_rows)} rows to {history_csv_file}")
-else:
-    print(f"No new history entries to append to {history_csv_file}")
-
-# Generate top 5 up, down, and unchanged table
-up_groups = [entry for entry in sorted_data if entry['up down'] != 'N/A' and entry['up down'] > 0]
-down_groups = [entry for entry in sorted_data if entry['up down'] != 'N/A' and entry['up down'] < 0]
-unchanged_groups = [entry for entry in sorted_data if entry['up down'] == 0]
-up_groups = sorted(up_groups, key=lambda x: (x['up down'], -x['rank']), reverse=True)[:5]
-down_groups = sorted(down_groups, key=lambda x: (x['up down'], -x['rank']), reverse=True)[:5]
-unchanged_groups = sorted(unchanged_groups, key=lambda x: x['rank'])[:5]
-
-top_movers_rows = ''
-if up_groups or down_groups or unchanged_groups:
-    for group_list, title in [(up_groups, 'Top 5 Up'), (down_groups, 'Top 5 Down'), (unchanged_groups, 'Top 5 Unchanged')]:
-        if group_list:
-            top_movers_rows += f'<tr><th style="background-color: #b30000;">{title}</th></tr><tr>'
-            for entry in group_list:
-                group_name = escape(entry['group name'])
-                photo_src = entry['photo_file_name']
-                html_link = f"HTML/{entry['html_file']}"
-                last_rank = entry['last rank']
-                last_rank_date = entry['last rank date']
-                last_rank_display = f"{last_rank} ({last_rank_date})" if last_rank != 'N/A' else 'N/A'
-                up_down = entry['up down']
-                up_down_img = 'https://via.placeholder.com/20'
-                if up_down > 0:
-                    up_url = f"{github_raw_base}/Photos/up.png"
-                    up_down_img = up_url if is_url_accessible(up_url) else up_down_img
-                elif up_down < 0:
-                    down_url = f"{github_raw_base}/Photos/down.png"
-                    up_down_img = down_url if is_url_accessible(down_url) else up_down_img
-                else:
-                    zero_url = f"{github_raw_base}/Photos/0.png"
-                    up_down_img = zero_url if is_url_accessible(zero_url) else up_down_img
-                print(f"Top Movers: Group {group_name}, Up Down image: {up_down_img}")
-                top_movers_rows += f"""
+    written = write_if_changed(csv_file, csv_buffer.getvalue())
+    write_counts['written' if written else 'skipped'] += 1
+    print(f"\n{'Wrote' if written else 'Unchanged'} CSV file: {csv_file}")
+
+    # Append new history entries to history.csv
+    new_history_rows = [{'date': current_date, 'group name': entry['group name'], 'rank': entry['rank']} for entry in sorted_data]
+    new_history_rows = [row for row in new_history_rows if row.get('group name') and row.get('rank') is not None]
+    if new_history_rows:
+        write_header = not os.path.exists(history_csv_file)
+        with open(history_csv_file, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=history_columns)
+            if write_header:
+                writer.writeheader()
+            writer.writerows(new_history_rows)
+        print(f"\nAppended {len(new_history_rows)} rows to {history_csv_file}")
+    else:
+        print(f"No new history entries to append to {history_csv_file}")
+    end_stage('csv and history output')
+
+    # Up/down indicator images, falling back to a placeholder when one is inaccessible
+    up_down_images = {'none': 'https://via.placeholder.com/20'}
+    for key, img in (('up', 'up.png'), ('down', 'down.png'), ('same', '0.png')):
+        img_url = f"{github_raw_base}/Photos/{img}"
+        up_down_images[key] = img_url if is_url_accessible(img_url) else up_down_images['none']
+    end_stage('url checks')
+
+    # Generate top 5 up, down, and unchanged table
+    up_groups = [entry for entry in sorted_data if entry['up down'] != 'N/A' and entry['up down'] > 0]
+    down_groups = [entry for entry in sorted_data if entry['up down'] != 'N/A' and entry['up down'] < 0]
+    unchanged_groups = [entry for entry in sorted_data if entry['up down'] == 0]
+    up_groups = sorted(up_groups, key=lambda x: (x['up down'], -x['rank']), reverse=True)[:5]
+    down_groups = sorted(down_groups, key=lambda x: (x['up down'], -x['rank']), reverse=True)[:5]
+    unchanged_groups = sorted(unchanged_groups, key=lambda x: x['rank'])[:5]
+
+    top_movers_rows = []
+    if up_groups or down_groups or unchanged_groups:
+        for group_list, title in [(up_groups, 'Top 5 Up'), (down_groups, 'Top 5 Down'), (unchanged_groups, 'Top 5 Unchanged')]:
+            if group_list:
+                top_movers_rows.append(f'<tr><th style="background-color: #b30000;">{title}</th></tr><tr>')
+                for entry in group_list:
+                    group_name = escape(entry['group name'])
+                    photo_src = entry['photo_file_name']
+                    html_link = f"HTML/{entry['html_file']}"
+                    last_rank = entry['last rank']
+                    last_rank_date = entry['last rank date']
+                    last_rank_display = f"{last_rank} ({last_rank_date})" if last_rank != 'N/A' else 'N/A'
+                    up_down = entry['up down']
+                    up_down_img = up_down_images['up' if up_down > 0 else 'down' if up_down < 0 else 'same']
+                    print(f"Top Movers: Group {group_name}, Up Down image: {up_down_img}")
+                    top_movers_rows.append(f"""
                     <td>
                         <div class="mover-info">
                             <p><strong>Name:</strong> <a href="{html_link}" target="_blank">{group_name}</a></p>
@@ -860,101 +1999,45 @@ if up_groups or down_groups or unchanged_groups:
                             <p><strong>Up Down:</strong> {up_down} <img src="{up_down_img}" alt="Up Down" class="up-down-img"></p>
                         </div>
                     </td>
-                """
-            top_movers_rows += '</tr>'
-else:
-    top_movers_rows = '<tr><td>No significant rank changes</td></tr>'
-
-# Generate ranking table rows
-table_rows = ''
-for entry in sorted_data:
-    group_name = escape(entry['group name'])
-    photo_src = entry['photo_file_name']
-    html_link = f"HTML/{entry['html_file']}"
-    last_scene = f"{entry['Datedifference']} days" if entry['Datedifference'] != 'N/A' else 'N/A'
-    last_rank = entry['last rank']
-    last_rank_date = entry['last rank date']
-    last_rank_display = f"{last_rank} ({last_rank_date})" if last_rank != 'N/A' else 'N/A'
-    up_down = entry['up down']
-    up_down_img = 'https://via.placeholder.com/20'
-    if up_down != 'N/A':
-        if up_down > 0:
-            up_url = f"{github_raw_base}/Photos/up.png"
-            up_down_img = up_url if is_url_accessible(up_url) else up_down_img
-        elif up_down < 0:
-            down_url = f"{github_raw_base}/Photos/down.png"
-            up_down_img = down_url if is_url_accessible(down_url) else up_down_img
-        else:
-            zero_url = f"{github_raw_base}/Photos/0.png"
-            up_down_img = zero_url if is_url_accessible(zero_url) else up_down_img
-    print(f"Ranking Table: Group {group_name}, Photo: {photo_src}, Up Down image: {up_down_img}")
-    table_rows += f"""
-    <tr>
-        <td>{entry['rank']}</td>
-        <td>{last_rank_display}</td>
-        <td>{up_down} <img src="{up_down_img}" alt="Up Down" class="up-down-img"></td>
-        <td><a href="{html_link}" target="_blank">{group_name}</a></td>
-        <td><div class="flip-card"><div class="flip-card-inner"><div class="flip-card-front"><img src="{photo_src}" alt="{group_name}" style="width:300px;height:300px;object-fit:cover;"></div><div class="flip-card-back"><a href="{html_link}" target="_blank" style="color: #e6b800; text-decoration: none;"><h1>{group_name}</h1></a></div></div></div></td>
-        <td>{last_scene}</td>
-        <td>{entry['total titles']}</td>
-        <td>{entry['count of the hashtag "#FIVE"']}</td>
-        <td>{entry['count of the hashtag "#FOUR"']}</td>
-        <td>{entry['count of the hashtag "#Three"']}</td>
-        <td>{entry['count of the hashtag "#SceneType"']}</td>
-        <td>{entry['score']:.2f}</td>
-    </tr>
-    """
-
-# Generate ranking HTML
-total_groups = len(sorted_data)
-ranking_html_content = f"""<!DOCTYPE html>
+                """)
+                top_movers_rows.append('</tr>')
+    else:
+        top_movers_rows.append('<tr><td>No significant rank changes</td></tr>')
+    top_movers_rows = ''.join(top_movers_rows)
+
+    # Ranking rows for docs/ranking.json, which the index table loads, renders a page at a time and sorts
+    ranking_rows = [{
+        'rank': entry['rank'],
+        'lastRank': entry['last rank'] if entry['last rank'] != 'N/A' else None,
+        'lastRankDate': entry['last rank date'] if entry['last rank'] != 'N/A' else None,
+        'upDown': entry['up down'] if entry['up down'] != 'N/A' else None,
+        'name': entry['group name'],
+        'page': f"HTML/{entry['html_file']}",
+        'photo': entry['photo_file_name'],
+        'lastScene': entry['Datedifference'] if entry['Datedifference'] != 'N/A' else None,
+        'titles': entry['total titles'],
+        'five': entry['count of the hashtag "#FIVE"'],
+        'four': entry['count of the hashtag "#FOUR"'],
+        'three': entry['count of the hashtag "#Three"'],
+        'sceneType': entry['count of the hashtag "#SceneType"'],
+        'score': round(entry['score'], 4),
+        'scoreHashtags': round(entry['score components']['hashtags'], 4),
+        'scoreMessages': round(entry['score components']['messages'], 4),
+        'scoreRecency': round(entry['score components']['recency'], 4)
+    } for entry in sorted_data]
+    ranking_json = json.dumps({'date': current_date, 'upDownImages': up_down_images, 'groups': ranking_rows}, ensure_ascii=False, separators=(',', ':'))
+    # Versioned URL so browsers fetch the new data as soon as the index changes
+    ranking_json_url = f"{os.path.basename(ranking_json_file)}?v={hashlib.sha1(ranking_json.encode('utf-8')).hexdigest()[:12]}"
+
+    # Generate ranking HTML
+    total_groups = len(sorted_data)
+    ranking_html_content = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>PS Ranking - {current_date}</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; background-color: #1e2a44; color: #ffffff; margin: 20px; text-align: center; }}
-        h1, h2 {{ color: #e6b800; }}
-        table {{ width: 80%; margin: 20px auto; border-collapse: collapse; background-color: #2a3a5c; box-shadow: 0 0 10px rgba(0, 0, 0, 0.3); }}
-        th, td {{ border: 1px solid #3b4a6b; text-align: center; vertical-align: middle; padding: 15px; color: #ffffff; }}
-        th {{ background-color: #e6b800; color: #1e2a44; cursor: pointer; }}
-        th:hover {{ background-color: #b30000; }}
-        tr:hover {{ background-color: #3b4a6b; }}
-        .up-down-img {{ width: 20px; height: 20px; vertical-align: middle; }}
-        a {{ text-decoration: none; color: #e6b800; }}
-        a:hover {{ color: #b30000; text-decoration: underline; }}
-        .flip-card {{ background-color: transparent; width: 300px; height: 300px; perspective: 1000px; margin: 10px auto; }}
-        .flip-card-inner {{ position: relative; width: 100%; height: 100%; text-align: center; transition: transform 0.6s; transform-style: preserve-3d; box-shadow: 0 4px 8px 0 rgba(0,0,0,0.2); }}
-        .flip-card:hover .flip-card-inner {{ transform: rotateY(180deg); }}
-        .flip-card-front, .flip-card-back {{ position: absolute; width: 100%; height: 100%; backface-visibility: hidden; border-radius: 5px; }}
-        .flip-card-front {{ background-color: #2a3a5c; color: #ffffff; }}
-        .flip-card-back {{ background-color: #3b4a6b; color: #e6b800; transform: rotateY(180deg); display: flex; justify-content: center; align-items: center; flex-direction: column; }}
-        .flip-card-back h1 {{ margin: 0; font-size: 24px; word-wrap: break-word; padding: 10px; }}
-        .mover-info {{ display: flex; flex-direction: column; align-items: center; gap: 10px; width: 320px; }}
-        .mover-info p {{ margin: 5px 0; font-size: 16px; }}
-        #topMoversTable td {{ min-width: 340px; }}
-        @keyframes countUp {{ from {{ content: "0"; }} to {{ content: attr(data-rank); }} }}
-        @media only screen and (max-width: 1200px) {{ 
-            table {{ width: 90%; }} 
-            .flip-card {{ width: 200px; height: 200px; }} 
-            .flip-card-back h1 {{ font-size: 18px; }}
-            th, td {{ font-size: 14px; padding: 10px; }}
-            .mover-info {{ width: 220px; }}
-            .mover-info p {{ font-size: 14px; }}
-            #topMoversTable td {{ min-width: 240px; }}
-        }}
-        @media only screen and (max-width: 768px) {{ 
-            table {{ width: 95%; }} 
-            .flip-card {{ width: 150px; height: 150px; }} 
-            .flip-card-back h1 {{ font-size: 16px; }}
-            th, td {{ font-size: 12px; padding: 8px; }}
-            .mover-info {{ width: 170px; }}
-            .mover-info p {{ font-size: 12px; }}
-            #topMoversTable td {{ min-width: 190px; }}
-            #topMoversTable {{ display: block; overflow-x: auto; white-space: nowrap; }}
-        }}
-    </style>
+    <link rel="stylesheet" href="assets/{index_css_file}">
 </head>
 <body>
     <h1>PS Ranking - {current_date}</h1>
@@ -965,7 +2048,7 @@ ranking_html_content = f"""<!DOCTYPE html>
         </tbody>
     </table>
     <h2>Total Number of Groups: {total_groups}</h2>
-    <table id="rankingTable">
+    <table id="rankingTable" data-src="{ranking_json_url}">
         <thead>
             <tr>
                 <th onclick="sortTable(0)">Rank</th>
@@ -982,66 +2065,38 @@ ranking_html_content = f"""<!DOCTYPE html>
                 <th onclick="sortTable(11)">Score</th>
             </tr>
         </thead>
-        <tbody id="tableBody">
-            {table_rows}
-        </tbody>
+        <tbody id="tableBody"></tbody>
     </table>
-    <script>
-        let sortDirections = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0];
-        function sortTable(columnIndex) {{
-            if (columnIndex === 4) return;
-            const tbody = document.getElementById('tableBody');
-            const rows = Array.from(tbody.getElementsByTagName('tr'));
-            const isNumeric = [true, true, true, false, false, true, true, true, true, true, true, true];
-            const direction = sortDirections[columnIndex] === 1 ? -1 : 1;
-            rows.sort((a, b) => {{
-                let aValue = a.cells[columnIndex].textContent;
-                let bValue = b.cells[columnIndex].textContent;
-                if (columnIndex === 1) {{ 
-                    if (aValue === 'N/A' && bValue === 'N/A') return 0;
-                    if (aValue === 'N/A') return direction * 1;
-                    if (bValue === 'N/A') return direction * -1;
-                    aValue = parseFloat(aValue.split(' ')[0]);
-                    bValue = parseFloat(bValue.split(' ')[0]);
-                    return direction * (aValue - bValue);
-                }} else if (columnIndex === 2) {{ 
-                    if (aValue === 'N/A' && bValue === 'N/A') return 0;
-                    if (aValue === 'N/A') return direction * 1;
-                    if (bValue === 'N/A') return direction * -1;
-                    aValue = parseFloat(aValue.split(' ')[0]);
-                    bValue = parseFloat(bValue.split(' ')[0]);
-                    return direction * (aValue - bValue);
-                }} else if (columnIndex === 5) {{ 
-                    if (aValue === 'N/A' && bValue === 'N/A') return 0;
-                    if (aValue === 'N/A') return direction * 1;
-                    if (bValue === 'N/A') return direction * -1;
-                    aValue = parseInt(aValue);
-                    bValue = parseInt(bValue);
-                    return direction * (aValue - bValue);
-                }}
-                if (isNumeric[columnIndex]) {{ 
-                    aValue = parseFloat(aValue) || aValue; 
-                    bValue = parseFloat(bValue) || bValue; 
-                    return direction * (aValue - bValue); 
-                }}
-                return direction * aValue.localeCompare(bValue);
-            }});
-            while (tbody.firstChild) {{ 
-                tbody.removeChild(tbody.firstChild); 
-            }}
-            rows.forEach(row => tbody.appendChild(row));
-            sortDirections[columnIndex] = direction;
-            sortDirections = sortDirections.map((d, i) => i === columnIndex ? d : 0);
-        }}
-    </script>
+    <div class="pager">
+        <button id="prevPage" onclick="changePage(-1)">❮ Previous</button>
+        <span id="pageInfo"></span>
+        <button id="nextPage" onclick="changePage(1)">Next ❯</button>
+    </div>
+    <script src="assets/{index_js_file}"></script>
 </body>
 </html>
 """
 
-# Write ranking HTML file
-ranking_html_file = os.path.join(output_folder, 'index.html')
-with open(ranking_html_file, 'w', encoding='utf-8') as f:
-    f.write(ranking_html_content)
-print(f"\nWrote ranking HTML file: {ranking_html_file}")
+    end_stage('index render')
+
+    # Write the ranking data and HTML file
+    written = write_if_changed(ranking_json_file, ranking_json)
+    write_counts['written' if written else 'skipped'] += 1
+    print(f"{'Wrote' if written else 'Unchanged'} ranking data: {ranking_json_file} ({len(ranking_rows)} groups)")
+    ranking_html_file = os.path.join(output_folder, 'index.html')
+    written = write_if_changed(ranking_html_file, ranking_html_content)
+    write_counts['written' if written else 'skipped'] += 1
+    print(f"\n{'Wrote' if written else 'Unchanged'} ranking HTML file: {ranking_html_file}")
+    print(f"Output files: {write_counts['written']} written, {write_counts['skipped']} skipped, {write_counts['removed']} removed")
+    end_stage('write')
+
+    save_url_cache()
+    print(f"URL cache: {url_cache_hits} hits, {url_cache_misses} misses")
+    end_stage('url checks')
+
+    print(f"\nProcessed {chat_counts['chats']} groups. Output written to {output_folder}")
+    write_run_report(group_timings, write_counts)
+
 
-print(f"\nProcessed {len(chats)} groups. Output written to {output_folder}")
\ No newline at end of file
+if __name__ == '__main__':
+    main()